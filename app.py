@@ -1,10 +1,22 @@
 import os
+import json
+import queue
+import threading
+import time
+import uuid
 import smtplib
+import csv
+import io
+import cProfile
+import pstats
 from email.message import EmailMessage
-from sqlalchemy import text
-from datetime import datetime, date
+import click
+from sqlalchemy import text, func, case, event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from datetime import datetime, date, timedelta
 import unicodedata
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, session, flash, g, has_request_context, send_from_directory
+from flask import before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
 
 APP_NAME = "ehairstyle"
@@ -71,10 +83,23 @@ class StaffHours(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.Integer, db.ForeignKey("staff.id"), nullable=False)
     weekday = db.Column(db.Integer, nullable=False)  # 0 Mon .. 6 Sun
+    # start_hm = end_hm = "" -> ρητά κλειστή ημέρα (καμία γραμμή = ωράριο καταστήματος)
     start_hm = db.Column(db.String(5), nullable=False, default="10:00")
     end_hm = db.Column(db.String(5), nullable=False, default="18:00")
 
 class Appointment(db.Model):
+    __table_args__ = (
+        db.Index("ix_appointment_staff_date", "staff_id", "appt_date"),
+        db.Index("ix_appointment_shop_date", "shop_id", "appt_date"),
+        db.Index("ix_appointment_date_start", "appt_date", "start_hm"),
+        # ένα ενεργό ραντεβού ανά υπάλληλο/ώρα (όλα τα slots είναι 30')
+        db.Index(
+            "uq_appointment_staff_slot", "staff_id", "appt_date", "start_hm", unique=True,
+            sqlite_where=text("status <> 'Ακυρωμένο'"),
+            postgresql_where=text("status <> 'Ακυρωμένο'"),
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     shop_id = db.Column(db.Integer, db.ForeignKey("shop.id"), nullable=False)
@@ -112,6 +137,97 @@ class BusinessLead(db.Model):
     phone = db.Column(db.String(60), nullable=False)
 
 
+class DailyStat(db.Model):
+    """Ημερήσια σύνοψη ανά (κατάστημα, υπάλληλο, υπηρεσία) για τα reports.
+
+    Ενημερώνεται incremental στο booking/ακύρωση (bump_daily_stat) και
+    ξαναχτίζεται από το Appointment με `flask --app app rebuild-stats`.
+    """
+    __table_args__ = (
+        db.UniqueConstraint("day", "shop_id", "staff_id", "service_id", name="uq_daily_stat_key"),
+        db.Index("ix_daily_stat_shop_day", "shop_id", "day"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD (appt_date)
+    shop_id = db.Column(db.Integer, db.ForeignKey("shop.id"), nullable=False)
+    staff_id = db.Column(db.Integer, db.ForeignKey("staff.id"), nullable=False)
+    service_id = db.Column(db.Integer, db.ForeignKey("service.id"), nullable=False)
+
+    bookings = db.Column(db.Integer, nullable=False, default=0)        # όλα τα ραντεβού που κλείστηκαν
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cents = db.Column(db.Integer, nullable=False, default=0)   # μόνο μη ακυρωμένα
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)  # μόνο μη ακυρωμένα
+
+
+class ScheduleException(db.Model):
+    """Εξαίρεση ωραρίου: αργία/κλειστό, άδεια υπαλλήλου ή διάλειμμα.
+
+    staff_id=None -> ισχύει για όλο το κατάστημα.
+    date_from/date_to (YYYY-MM-DD, inclusive) και weekday περιορίζουν τις ημέρες
+    (None = χωρίς όριο), π.χ. weekday μόνο -> κάθε εβδομάδα (μεσημεριανό διάλειμμα).
+    start_hm/end_hm=None -> κλειστό όλη την ημέρα.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey("shop.id"), nullable=False, index=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey("staff.id"), nullable=True)
+    date_from = db.Column(db.String(10), nullable=True)
+    date_to = db.Column(db.String(10), nullable=True)
+    weekday = db.Column(db.Integer, nullable=True)  # 0 Mon .. 6 Sun
+    start_hm = db.Column(db.String(5), nullable=True)
+    end_hm = db.Column(db.String(5), nullable=True)
+    note = db.Column(db.String(140), nullable=True)
+
+class StaffDayCalendar(db.Model):
+    """Υλοποιημένο ημερήσιο ωράριο: ShopHours ∩ StaffHours − εξαιρέσεις.
+
+    intervals = "10:00-13:00,14:00-18:00" (κενό = κλειστό). Το available_slots
+    διαβάζει μία γραμμή· ξαναχτίζεται από compile_calendar όταν αλλάζει κάτι.
+    """
+    __table_args__ = (
+        db.UniqueConstraint("staff_id", "day", name="uq_staff_day_calendar"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey("staff.id"), nullable=False)
+    shop_id = db.Column(db.Integer, db.ForeignKey("shop.id"), nullable=False, index=True)
+    day = db.Column(db.String(10), nullable=False)
+    intervals = db.Column(db.String(200), nullable=False, default="")
+
+
+class SlowRequest(db.Model):
+    """Requests πάνω από SLOW_REQUEST_MS, με ανάλυση των SQL (βλ. /admin/slow)."""
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(300), nullable=False)
+    endpoint = db.Column(db.String(80), nullable=True)
+    status = db.Column(db.Integer, nullable=False)
+    duration_ms = db.Column(db.Integer, nullable=False)
+    params = db.Column(db.Text, nullable=True)          # JSON: args + ονόματα πεδίων φόρμας
+    sql_count = db.Column(db.Integer, nullable=False, default=0)
+    sql_ms = db.Column(db.Integer, nullable=False, default=0)
+    sql_breakdown = db.Column(db.Text, nullable=True)   # JSON: [{sql, count, ms}] (top 10)
+    template_ms = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AppointmentReminder(db.Model):
+    """Κατάσταση υπενθύμισης ανά (ραντεβού, παράθυρο). Η εισαγωγή της γραμμής = claim."""
+    __table_args__ = (
+        db.UniqueConstraint("appointment_id", "kind", name="uq_reminder_appt_kind"),
+        db.Index("ix_reminder_pending", "sent_at", "claimed_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # π.χ. "24h", "2h"
+    claim_token = db.Column(db.String(36), nullable=False)
+    claimed_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(300), nullable=True)
+
+
 def ensure_schema():
     """Adds missing columns on existing DBs (simple MVP migration)."""
     try:
@@ -125,6 +241,75 @@ def ensure_schema():
         except Exception:
             pass
 
+    # Indexes για range queries (διαθεσιμότητα, συγκρούσεις). Σε νέα DB τα φτιάχνει το create_all.
+    if not db.inspect(db.engine).has_table("appointment"):
+        return
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_appointment_staff_date ON appointment (staff_id, appt_date);",
+        "CREATE INDEX IF NOT EXISTS ix_appointment_shop_date ON appointment (shop_id, appt_date);",
+        "CREATE INDEX IF NOT EXISTS ix_appointment_date_start ON appointment (appt_date, start_hm);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_appointment_staff_slot ON appointment (staff_id, appt_date, start_hm)"
+        " WHERE status <> 'Ακυρωμένο';",
+    ):
+        try:
+            db.session.execute(text(ddl))
+            db.session.commit()
+        except Exception as e:
+            # π.χ. διπλά ενεργά ραντεβού στο ίδιο slot: χωρίς το unique index
+            # το insert_appointment δεν προστατεύει από double booking
+            app.logger.warning("ensure_schema: %s failed: %s", ddl.split(" ON ")[0], e)
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+
+    migrate_legacy_staff_hours()
+
+
+def migrate_legacy_staff_hours():
+    """Υπάλληλοι με StaffHours για λιγότερες από 7 ημέρες (παλιό admin_staff_new: Τρ-Σα).
+
+    Πριν από τα ωράρια υπαλλήλων ίσχυε μόνο το ωράριο καταστήματος, οπότε οι ημέρες
+    που λείπουν συμπληρώνονται από το ShopHours (ή ρητά κλειστές), ώστε να μη
+    χαθεί π.χ. η Δευτέρα. Τρέχει μία φορά: μετά έχουν όλοι 7 γραμμές.
+    """
+    try:
+        legacy = [
+            sid for (sid,) in (
+                db.session.query(StaffHours.staff_id)
+                .group_by(StaffHours.staff_id)
+                .having(func.count(StaffHours.id) < 7)
+            )
+        ]
+        if not legacy:
+            return
+        by_shop = {}
+        for st in Staff.query.filter(Staff.id.in_(legacy)).all():
+            by_shop.setdefault(st.shop_id, []).append(st.id)
+        for shop_id, staff_ids in by_shop.items():
+            shop_hours = {h.weekday: h for h in ShopHours.query.filter_by(shop_id=shop_id).all()}
+            have = set(
+                db.session.query(StaffHours.staff_id, StaffHours.weekday)
+                .filter(StaffHours.staff_id.in_(staff_ids))
+            )
+            for staff_id in staff_ids:
+                for wd in range(7):
+                    if (staff_id, wd) in have:
+                        continue
+                    h = shop_hours.get(wd)
+                    db.session.add(StaffHours(staff_id=staff_id, weekday=wd,
+                                              start_hm=h.start_hm if h else "", end_hm=h.end_hm if h else ""))
+            db.session.flush()
+            compile_calendar(shop_id, staff_ids)
+        db.session.commit()
+        app.logger.warning("migrated staff hours for %d staff (missing weekdays from shop hours)", len(legacy))
+    except Exception as e:
+        app.logger.warning("migrate_legacy_staff_hours failed: %s", e)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+
 
 def cents_to_eur(cents: int) -> str:
     return f"{cents/100:.2f}"
@@ -133,6 +318,28 @@ def hm_to_minutes(hm: str) -> int:
     h, m = hm.split(":")
     return int(h) * 60 + int(m)
 
+def valid_hm(hm: str) -> bool:
+    """"HH:MM" με 00 <= HH < 24 και 00 <= MM < 60."""
+    if len(hm) != 5 or hm[2] != ":" or not (hm[:2].isdigit() and hm[3:].isdigit()):
+        return False
+    return int(hm[:2]) < 24 and int(hm[3:]) < 60
+
+def parse_week_hours(form):
+    """start_0..6 / end_0..6 της φόρμας -> {weekday: (start, end)} για τις ανοιχτές ημέρες.
+
+    Κενό πεδίο = κλειστή ημέρα. None αν κάποια ώρα δεν είναι HH:MM ή λήγει πριν αρχίσει.
+    """
+    hours = {}
+    for wd in range(7):
+        start = (form.get(f"start_{wd}") or "").strip()
+        end = (form.get(f"end_{wd}") or "").strip()
+        if not (start and end):
+            continue
+        if not (valid_hm(start) and valid_hm(end)) or hm_to_minutes(end) <= hm_to_minutes(start):
+            return None
+        hours[wd] = (start, end)
+    return hours
+
 def minutes_to_hm(minutes: int) -> str:
     h = minutes // 60
     m = minutes % 60
@@ -148,6 +355,175 @@ def get_booking_state():
 def clear_booking():
     session.pop("booking", None)
 
+# ---------------------------------------------------------------------------
+# Ημερολόγιο διαθεσιμότητας (StaffDayCalendar)
+# ---------------------------------------------------------------------------
+
+CALENDAR_WEEKS = int(os.environ.get("CALENDAR_WEEKS") or "8")
+
+def subtract_interval(intervals, start: int, end: int):
+    out = []
+    for a, b in intervals:
+        if end <= a or start >= b:
+            out.append((a, b))
+            continue
+        if a < start:
+            out.append((a, start))
+        if end < b:
+            out.append((end, b))
+    return out
+
+def exception_applies(ex: ScheduleException, iso_date: str, wd: int) -> bool:
+    if ex.date_from and iso_date < ex.date_from:
+        return False
+    if ex.date_to and iso_date > ex.date_to:
+        return False
+    if ex.weekday is not None and ex.weekday != wd:
+        return False
+    return True
+
+def day_intervals(iso_date: str, shop_hours: dict, staff_hours, exceptions):
+    """Ανοιχτά διαστήματα (λεπτά) μιας ημέρας για έναν υπάλληλο.
+
+    staff_hours=None -> ο υπάλληλος δεν έχει δικό του ωράριο, ισχύει του καταστήματος.
+    """
+    wd = weekday_of(iso_date)
+    sh = shop_hours.get(wd)
+    if not sh:
+        return []
+    start, end = sh
+    if staff_hours is not None:
+        st = staff_hours.get(wd)
+        if not st:
+            return []
+        start, end = max(start, st[0]), min(end, st[1])
+    if end <= start:
+        return []
+
+    intervals = [(start, end)]
+    for ex in exceptions:
+        if not exception_applies(ex, iso_date, wd):
+            continue
+        if ex.start_hm and ex.end_hm:
+            intervals = subtract_interval(intervals, hm_to_minutes(ex.start_hm), hm_to_minutes(ex.end_hm))
+        else:
+            return []
+    return intervals
+
+def encode_intervals(intervals) -> str:
+    return ",".join(f"{minutes_to_hm(a)}-{minutes_to_hm(b)}" for a, b in intervals)
+
+def decode_intervals(raw: str):
+    out = []
+    for part in (raw or "").split(","):
+        if part:
+            a, b = part.split("-")
+            out.append((hm_to_minutes(a), hm_to_minutes(b)))
+    return out
+
+def _hours_map(rows):
+    # γραμμές με κενές ώρες = κλειστή ημέρα (λείπουν από το map)
+    return {h.weekday: (hm_to_minutes(h.start_hm), hm_to_minutes(h.end_hm)) for h in rows if h.start_hm and h.end_hm}
+
+def load_schedule_rules(shop_id: int, staff_ids, since: str, until: str):
+    """Όλοι οι κανόνες για τους υπαλλήλους ενός καταστήματος, με 3 queries."""
+    shop_hours = _hours_map(ShopHours.query.filter_by(shop_id=shop_id).all())
+
+    staff_hours = {}
+    for h in StaffHours.query.filter(StaffHours.staff_id.in_(staff_ids)).all():
+        staff_hours.setdefault(h.staff_id, []).append(h)
+    staff_hours = {sid: _hours_map(rows) for sid, rows in staff_hours.items()}
+
+    exceptions = (
+        ScheduleException.query
+        .filter(ScheduleException.shop_id == shop_id)
+        .filter(db.or_(ScheduleException.staff_id.is_(None), ScheduleException.staff_id.in_(staff_ids)))
+        .filter(db.or_(ScheduleException.date_to.is_(None), ScheduleException.date_to >= since))
+        .filter(db.or_(ScheduleException.date_from.is_(None), ScheduleException.date_from <= until))
+        .all()
+    )
+    return shop_hours, staff_hours, exceptions
+
+def compile_calendar(shop_id: int, staff_ids=None, since: str = None, until: str = None) -> set:
+    """Ξαναχτίζει τις γραμμές StaffDayCalendar για (υπαλλήλους × ημέρες). Δεν κάνει commit.
+
+    Γράφει μόνο όσες άλλαξαν και τις επιστρέφει ως {(staff_id, iso_date)}, ώστε ο
+    έλεγχος συγκρούσεων να κοιτάει μόνο αυτές τις ημέρες.
+    """
+    today = date.today()
+    since = max(since or today.isoformat(), today.isoformat())
+    until = min(until or (today + timedelta(weeks=CALENDAR_WEEKS)).isoformat(),
+                (today + timedelta(weeks=CALENDAR_WEEKS)).isoformat())
+    if until < since:
+        return set()
+    if staff_ids is None:
+        staff_ids = [sid for (sid,) in db.session.query(Staff.id).filter(Staff.shop_id == shop_id)]
+    if not staff_ids:
+        return set()
+
+    shop_hours, staff_hours, exceptions = load_schedule_rules(shop_id, staff_ids, since, until)
+
+    days = []
+    d, d1 = date.fromisoformat(since), date.fromisoformat(until)
+    while d <= d1:
+        days.append(d.isoformat())
+        d += timedelta(days=1)
+
+    existing = {
+        (staff_id, day): (row_id, raw)
+        for row_id, staff_id, day, raw in (
+            db.session.query(StaffDayCalendar.id, StaffDayCalendar.staff_id, StaffDayCalendar.day, StaffDayCalendar.intervals)
+            .filter(StaffDayCalendar.staff_id.in_(staff_ids))
+            .filter(StaffDayCalendar.day >= since, StaffDayCalendar.day <= until)
+        )
+    }
+
+    inserts, updates, changed = [], [], set()
+    for staff_id in staff_ids:
+        mine = [ex for ex in exceptions if ex.staff_id in (None, staff_id)]
+        for iso in days:
+            raw = encode_intervals(day_intervals(iso, shop_hours, staff_hours.get(staff_id), mine))
+            old = existing.get((staff_id, iso))
+            if old is None:
+                inserts.append(dict(staff_id=staff_id, shop_id=shop_id, day=iso, intervals=raw))
+            elif old[1] != raw:
+                updates.append(dict(row_id=old[0], new_intervals=raw))
+            else:
+                continue
+            changed.add((staff_id, iso))
+
+    cal = StaffDayCalendar.__table__
+    if updates:
+        db.session.execute(
+            cal.update().where(cal.c.id == db.bindparam("row_id")).values(intervals=db.bindparam("new_intervals")),
+            updates,
+        )
+    if inserts:
+        db.session.execute(cal.insert(), inserts)
+    return changed
+
+@app.cli.command("rebuild-calendar")
+def rebuild_calendar_command():
+    """flask --app app rebuild-calendar  (π.χ. κάθε βράδυ, για να προχωράει το παράθυρο)"""
+    n = 0
+    for (shop_id,) in db.session.query(Shop.id).all():
+        n += len(compile_calendar(shop_id))
+    (
+        StaffDayCalendar.query
+        .filter(StaffDayCalendar.day < date.today().isoformat())
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    print(f"compiled {n} changed staff/day rows")
+
+def staff_day_intervals(staff: Staff, iso_date: str):
+    row = StaffDayCalendar.query.filter_by(staff_id=staff.id, day=iso_date).first()
+    if row is not None:
+        return decode_intervals(row.intervals)
+    # εκτός παραθύρου (ή δεν έχει χτιστεί ακόμα): υπολογισμός επί τόπου
+    shop_hours, staff_hours, exceptions = load_schedule_rules(staff.shop_id, [staff.id], iso_date, iso_date)
+    return day_intervals(iso_date, shop_hours, staff_hours.get(staff.id), exceptions)
+
 def available_slots(staff_id: int, iso_date: str, duration_min: int, step_min: int = 30):
     # ✅ Κάθε υπηρεσία = 30 λεπτά (σταθερά)
     duration_min = 30
@@ -157,16 +533,9 @@ def available_slots(staff_id: int, iso_date: str, duration_min: int, step_min: i
     if not staff:
         return []
 
-    wd = weekday_of(iso_date)
-
-    # ✅ Ωράριο από το κατάστημα (ShopHours)
-    hours = ShopHours.query.filter_by(shop_id=staff.shop_id, weekday=wd).first()
-    if not hours:
-        return []
-
-    start = hm_to_minutes(hours.start_hm)
-    end = hm_to_minutes(hours.end_hm)
-    if end <= start:
+    # ✅ Ωράριο κατάστημα ∩ υπάλληλος − εξαιρέσεις (StaffDayCalendar)
+    intervals = staff_day_intervals(staff, iso_date)
+    if not intervals:
         return []
 
     appts = (
@@ -176,20 +545,989 @@ def available_slots(staff_id: int, iso_date: str, duration_min: int, step_min: i
         .all()
     )
     busy = [(hm_to_minutes(a.start_hm), hm_to_minutes(a.end_hm)) for a in appts]
+    return free_slots(intervals, busy, duration_min, step_min)
 
+def free_slots(intervals, busy, duration_min: int = 30, step_min: int = 30):
+    """Ελεύθερες ώρες (HH:MM) μέσα στα ανοιχτά διαστήματα, εκτός των busy (λεπτά)."""
     slots = []
-    t = start
-    last_start = end - duration_min
+    for start, end in intervals:
+        t = start
+        last_start = end - duration_min
 
-    while t <= last_start:
-        cand = (t, t + duration_min)
-        if all(cand[1] <= b[0] or cand[0] >= b[1] for b in busy):
-            slots.append(minutes_to_hm(t))
-        t += step_min
+        while t <= last_start:
+            cand = (t, t + duration_min)
+            if all(cand[1] <= b[0] or cand[0] >= b[1] for b in busy):
+                slots.append(minutes_to_hm(t))
+            t += step_min
 
     return slots
 
 
+ANY_STAFF = "any"
+
+def shop_day_availability(shop_id: int, iso_date: str):
+    """Ελεύθερα slots + φόρτος ημέρας για όλους τους ενεργούς υπαλλήλους, σε ένα πέρασμα.
+
+    {staff_id: {"slots": [...], "open_min": int, "booked_min": int}}
+    """
+    staff_ids = [sid for (sid,) in (
+        db.session.query(Staff.id).filter(Staff.shop_id == shop_id, Staff.is_active.is_(True))
+    )]
+    if not staff_ids:
+        return {}
+
+    intervals = {
+        row.staff_id: decode_intervals(row.intervals)
+        for row in StaffDayCalendar.query
+        .filter(StaffDayCalendar.staff_id.in_(staff_ids), StaffDayCalendar.day == iso_date)
+    }
+    missing = [sid for sid in staff_ids if sid not in intervals]
+    if missing:
+        shop_hours, staff_hours, exceptions = load_schedule_rules(shop_id, missing, iso_date, iso_date)
+        for sid in missing:
+            mine = [ex for ex in exceptions if ex.staff_id in (None, sid)]
+            intervals[sid] = day_intervals(iso_date, shop_hours, staff_hours.get(sid), mine)
+
+    busy = {sid: [] for sid in staff_ids}
+    for staff_id, start_hm, end_hm in (
+        db.session.query(Appointment.staff_id, Appointment.start_hm, Appointment.end_hm)
+        .filter(Appointment.shop_id == shop_id, Appointment.appt_date == iso_date)
+        .filter(Appointment.status != "Ακυρωμένο")
+        .filter(Appointment.staff_id.in_(staff_ids))
+    ):
+        busy[staff_id].append((hm_to_minutes(start_hm), hm_to_minutes(end_hm)))
+
+    return {
+        sid: dict(
+            slots=free_slots(intervals[sid], busy[sid]),
+            open_min=sum(b - a for a, b in intervals[sid]),
+            booked_min=sum(b - a for a, b in busy[sid]),
+        )
+        for sid in staff_ids
+    }
+
+def any_staff_slots(availability) -> list:
+    return sorted({hm for a in availability.values() for hm in a["slots"]})
+
+def rank_staff_for_slot(availability, hm: str) -> list:
+    """Υπάλληλοι ελεύθεροι στο hm, πρώτα όποιος έχει τη μικρότερη πληρότητα τη μέρα."""
+    eligible = [(sid, a) for sid, a in availability.items() if hm in a["slots"]]
+    eligible.sort(key=lambda kv: (kv[1]["booked_min"] / kv[1]["open_min"] if kv[1]["open_min"] else 1.0,
+                                  kv[1]["booked_min"], kv[0]))
+    return [sid for sid, _ in eligible]
+
+def insert_appointment(appt: Appointment) -> bool:
+    """INSERT του ραντεβού. False αν ο υπάλληλος πιάστηκε στο μεταξύ (uq_appointment_staff_slot)
+    ή αν η βάση δεν το δέχτηκε (π.χ. "database is locked"): τότε δοκιμάζεται ο επόμενος.
+
+    Στο SQLite δεν χρησιμοποιούμε savepoint: ο pysqlite δεν στέλνει BEGIN πριν από
+    SAVEPOINT, οπότε το RELEASE θα έκανε commit μόνο του. Κάνουμε flush μέσα στο
+    transaction του driver και σε αποτυχία rollback — ο caller δεν έχει γράψει τίποτα ακόμα.
+    """
+    if db.engine.dialect.name == "sqlite":
+        db.session.add(appt)
+        try:
+            db.session.flush()
+            return True
+        except (IntegrityError, OperationalError):
+            db.session.rollback()
+            return False
+    try:
+        with db.session.begin_nested():
+            db.session.add(appt)
+        return True
+    except (IntegrityError, OperationalError):
+        return False
+
+# ---------------------------------------------------------------------------
+# Live slots (Server-Sent Events)
+#
+# Κάθε (staff, ημερομηνία) έχει ένα "κανάλι". Το book_confirm δημοσιεύει
+# "taken" και οι ακυρώσεις του admin νέο "snapshot". Οι συνδεδεμένοι browsers στο
+# βήμα 4 παίρνουν το event και ενημερώνουν τη λίστα χωρίς reload.
+#
+# Για χιλιάδες ανοιχτές συνδέσεις τρέξε gunicorn με gevent worker
+# (βλ. README) ώστε κάθε σύνδεση να είναι ένα greenlet και όχι ένας worker.
+# Με SLOT_BROKER_URL=redis://... τα events περνάνε σε όλους τους workers.
+# ---------------------------------------------------------------------------
+
+SSE_HEARTBEAT_SEC = int(os.environ.get("SSE_HEARTBEAT_SEC") or "20")
+SSE_MAX_LIFETIME_SEC = int(os.environ.get("SSE_MAX_LIFETIME_SEC") or "300")
+SSE_QUEUE_SIZE = 64
+# auto = μόνο όταν δεν κρατάει worker (gevent ή asgi.py)· 1 / 0 = πάντα / ποτέ
+LIVE_SLOTS = (os.environ.get("LIVE_SLOTS") or "auto").strip().lower()
+SERVING_ASGI = False  # το asgi.py το κάνει True
+
+
+def live_slots_enabled() -> bool:
+    """Με sync workers μία ανοιχτή SSE σύνδεση πιάνει ολόκληρο worker (και το /healthz)."""
+    if LIVE_SLOTS != "auto":
+        return LIVE_SLOTS in ("1", "true", "yes", "on")
+    if SERVING_ASGI:
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+class SlotBroker:
+    """In-process fan-out των slot events ανά (staff_id, iso_date)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}  # (staff_id, iso_date) -> set(queue.Queue)
+        self._redis = None
+        self._listener = None
+
+    # --- optional multi-worker backend -----------------------------------
+
+    def use_redis(self, url: str):
+        """Δημοσίευση μέσω Redis pub/sub ώστε να βλέπουν τα events όλοι οι workers."""
+        try:
+            import redis  # προαιρετικό (requirements-live.txt)
+        except ImportError:
+            app.logger.warning("SLOT_BROKER_URL is set but redis is not installed (requirements-live.txt); using in-process broker")
+            return False
+        self._redis = redis.Redis.from_url(url)
+        return True
+
+    def _start_listener(self):
+        # ένα thread ανά worker, lazily (μετά το fork του gunicorn)
+        if self._redis is None or self._listener is not None:
+            return
+
+        def run():
+            # Αν πέσει η σύνδεση με το Redis ξανασυνδεόμαστε (backoff έως 30s).
+            # Όσα events χαθούν στο μεταξύ τα διορθώνει το snapshot στο reconnect
+            # του browser (SSE_MAX_LIFETIME_SEC).
+            delay = 1
+            while True:
+                pubsub = None
+                try:
+                    pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.psubscribe("slots:*")
+                    delay = 1
+                    for msg in pubsub.listen():
+                        try:
+                            _, staff_id, iso_date = msg["channel"].decode().split(":", 2)
+                            self._deliver((int(staff_id), iso_date), json.loads(msg["data"]))
+                        except Exception:
+                            continue
+                except Exception as e:
+                    app.logger.warning("slot broker: redis listener failed (%s), reconnecting in %ss", e, delay)
+                finally:
+                    if pubsub is not None:
+                        try:
+                            pubsub.close()
+                        except Exception:
+                            pass
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        self._listener = threading.Thread(target=run, name="slot-broker", daemon=True)
+        self._listener.start()
+
+    # --- pub/sub ---------------------------------------------------------
+
+    def subscribe(self, staff_id: int, iso_date: str, q=None):
+        """q: οτιδήποτε με put_nowait() (default queue.Queue· το asgi.py δίνει asyncio adapter)."""
+        q = q if q is not None else queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            self._start_listener()
+            self._subs.setdefault((staff_id, iso_date), set()).add(q)
+        return q
+
+    def unsubscribe(self, staff_id: int, iso_date: str, q):
+        key = (staff_id, iso_date)
+        with self._lock:
+            subs = self._subs.get(key)
+            if subs is None:
+                return
+            subs.discard(q)
+            if not subs:
+                del self._subs[key]
+
+    def publish(self, staff_id: int, iso_date: str, event: dict):
+        if self._redis is not None:
+            try:
+                self._redis.publish(f"slots:{staff_id}:{iso_date}", json.dumps(event))
+                return
+            except Exception:
+                pass  # fallback: τουλάχιστον ο τρέχων worker
+        self._deliver((staff_id, iso_date), event)
+
+    def _deliver(self, key, event: dict):
+        with self._lock:
+            subs = list(self._subs.get(key, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # αργός client: θα πάρει snapshot στο reconnect
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._subs.values())
+
+
+slot_broker = SlotBroker()
+if (os.environ.get("SLOT_BROKER_URL") or "").strip():
+    slot_broker.use_redis(os.environ["SLOT_BROKER_URL"].strip())
+
+
+def sse_format(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def publish_slots_snapshot(staff_id: int, iso_date: str):
+    """Ολόκληρη η λίστα ωρών (όχι "freed"), όταν η ώρα που ελευθερώθηκε ίσως δεν είναι κλείσιμη."""
+    staff = Staff.query.get(staff_id)
+    slots = available_slots(staff_id, iso_date, 30) if staff and staff.is_active else []
+    slot_broker.publish(staff_id, iso_date, {"type": "snapshot", "slots": slots})
+
+
+# ---------------------------------------------------------------------------
+# Reports (ημερήσια rollups)
+# ---------------------------------------------------------------------------
+
+def bump_daily_stat(appt: Appointment, service: Service, bookings: int = 0, cancellations: int = 0, sign: int = 1):
+    """Atomic increment της γραμμής DailyStat του ραντεβού (μέσα στο τρέχον transaction).
+
+    sign=+1 για νέο ραντεβού, -1 όταν ακυρώνεται (αφαιρεί έσοδα/λεπτά).
+    """
+    key = (appt.appt_date, appt.shop_id, appt.staff_id, appt.service_id)
+    # ίδιο με το rebuild_daily_stats: λεπτά = service.duration_min
+    bump_stat_key(key, bookings, cancellations, sign * service.price_cents, sign * service.duration_min)
+
+
+def dialect_upsert_insert():
+    """insert() με ON CONFLICT για SQLite/Postgres, αλλιώς None."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    else:
+        upsert_insert = None
+    return upsert_insert
+
+def bump_stat_key(key, bookings: int, cancellations: int, revenue_cents: int, booked_minutes: int):
+    """key = (day, shop_id, staff_id, service_id)"""
+    deltas = {
+        DailyStat.bookings: DailyStat.bookings + bookings,
+        DailyStat.cancellations: DailyStat.cancellations + cancellations,
+        DailyStat.revenue_cents: DailyStat.revenue_cents + revenue_cents,
+        DailyStat.booked_minutes: DailyStat.booked_minutes + booked_minutes,
+    }
+    day, shop_id, staff_id, service_id = key
+    key = dict(day=day, shop_id=shop_id, staff_id=staff_id, service_id=service_id)
+
+    upsert_insert = dialect_upsert_insert()
+    if upsert_insert is not None:
+        # ένα statement, χωρίς savepoint (στο SQLite το RELEASE θα έκανε commit μόνο του)
+        stmt = upsert_insert(DailyStat).values(
+            **key,
+            bookings=bookings,
+            cancellations=cancellations,
+            revenue_cents=revenue_cents,
+            booked_minutes=booked_minutes,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "shop_id", "staff_id", "service_id"],
+            set_={col.key: expr for col, expr in deltas.items()},
+        )
+        db.session.execute(stmt)
+        return
+
+    for _ in range(2):
+        if DailyStat.query.filter_by(**key).update(deltas, synchronize_session=False):
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(DailyStat(
+                    **key,
+                    bookings=bookings,
+                    cancellations=cancellations,
+                    revenue_cents=revenue_cents,
+                    booked_minutes=booked_minutes,
+                ))
+            return
+        except IntegrityError:
+            # άλλος worker μόλις έφτιαξε τη γραμμή -> ξανά UPDATE
+            continue
+
+
+def rebuild_daily_stats(since: str = None, until: str = None) -> int:
+    """Ξαναχτίζει τα DailyStat από το Appointment (backfill / διόρθωση). Επιστρέφει #γραμμών."""
+    cancelled = Appointment.status == "Ακυρωμένο"
+    active = case((cancelled, 0), else_=1)
+
+    stats = DailyStat.query
+    appts = (
+        db.session.query(
+            Appointment.appt_date,
+            Appointment.shop_id,
+            Appointment.staff_id,
+            Appointment.service_id,
+            func.count(Appointment.id),
+            func.sum(case((cancelled, 1), else_=0)),
+            func.sum(active * Service.price_cents),
+            func.sum(active * Service.duration_min),
+        )
+        .join(Service, Service.id == Appointment.service_id)
+        .group_by(Appointment.appt_date, Appointment.shop_id, Appointment.staff_id, Appointment.service_id)
+    )
+    if since:
+        stats = stats.filter(DailyStat.day >= since)
+        appts = appts.filter(Appointment.appt_date >= since)
+    if until:
+        stats = stats.filter(DailyStat.day <= until)
+        appts = appts.filter(Appointment.appt_date <= until)
+
+    rows = [
+        dict(day=d, shop_id=sh, staff_id=st, service_id=sv,
+             bookings=n, cancellations=c or 0, revenue_cents=rev or 0, booked_minutes=mins or 0)
+        for d, sh, st, sv, n, c, rev, mins in appts.all()
+    ]
+    stats.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(DailyStat.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """flask --app app rebuild-stats  (προαιρετικά STATS_SINCE / STATS_UNTIL=YYYY-MM-DD)"""
+    n = rebuild_daily_stats(
+        (os.environ.get("STATS_SINCE") or "").strip() or None,
+        (os.environ.get("STATS_UNTIL") or "").strip() or None,
+    )
+    print(f"rebuilt {n} daily stat rows")
+
+
+def staff_open_minutes(shop_id: int, staff_ids, since: str, until: str) -> dict:
+    """Λεπτά διαθεσιμότητας ανά υπάλληλο στο διάστημα: {staff_id: λεπτά}.
+
+    Ίδιοι κανόνες με το StaffDayCalendar (ShopHours ∩ StaffHours − εξαιρέσεις):
+    οι χτισμένες ημέρες διαβάζονται από εκεί, οι υπόλοιπες (π.χ. παρελθόν)
+    υπολογίζονται από τους τρέχοντες κανόνες.
+    """
+    staff_ids = list(staff_ids)
+    if not staff_ids or until < since:
+        return {}
+    compiled = {
+        (staff_id, day): raw
+        for staff_id, day, raw in (
+            db.session.query(StaffDayCalendar.staff_id, StaffDayCalendar.day, StaffDayCalendar.intervals)
+            .filter(StaffDayCalendar.staff_id.in_(staff_ids))
+            .filter(StaffDayCalendar.day >= since, StaffDayCalendar.day <= until)
+        )
+    }
+    shop_hours, staff_hours, exceptions = load_schedule_rules(shop_id, staff_ids, since, until)
+
+    days = []
+    d, d1 = date.fromisoformat(since), date.fromisoformat(until)
+    while d <= d1:
+        days.append(d.isoformat())
+        d += timedelta(days=1)
+
+    out = {}
+    for staff_id in staff_ids:
+        mine = [ex for ex in exceptions if ex.staff_id in (None, staff_id)]
+        total = 0
+        for iso in days:
+            raw = compiled.get((staff_id, iso))
+            if raw is not None:
+                intervals = decode_intervals(raw)
+            else:
+                intervals = day_intervals(iso, shop_hours, staff_hours.get(staff_id), mine)
+            total += sum(b - a for a, b in intervals)
+        out[staff_id] = total
+    return out
+
+
+def shop_report(shop_id: int, since: str, until: str) -> dict:
+    """Σύνολα + ανάλυση ανά υπάλληλο/υπηρεσία, μόνο από τα DailyStat."""
+    aggs = (
+        func.coalesce(func.sum(DailyStat.bookings), 0),
+        func.coalesce(func.sum(DailyStat.cancellations), 0),
+        func.coalesce(func.sum(DailyStat.revenue_cents), 0),
+        func.coalesce(func.sum(DailyStat.booked_minutes), 0),
+    )
+    in_range = (DailyStat.shop_id == shop_id, DailyStat.day >= since, DailyStat.day <= until)
+
+    def row(label, b, c, rev, mins, capacity):
+        return dict(
+            label=label,
+            bookings=b,
+            cancellations=c,
+            cancel_rate=round(100.0 * c / b, 1) if b else 0.0,
+            revenue_cents=rev,
+            booked_minutes=mins,
+            utilization=round(100.0 * mins / capacity, 1) if capacity else None,
+        )
+
+    staff_rows = (
+        db.session.query(Staff.id, Staff.name, *aggs)
+        .join(Staff, Staff.id == DailyStat.staff_id)
+        .filter(*in_range)
+        .group_by(Staff.id, Staff.name)
+        .order_by(Staff.name.asc())
+        .all()
+    )
+    # χωρητικότητα μόνο για όσους εμφανίζονται στα DailyStat (και ανενεργούς)
+    capacity = staff_open_minutes(shop_id, [r[0] for r in staff_rows], since, until)
+    by_staff = [
+        row(name, b, c, rev, mins, capacity.get(staff_id, 0))
+        for staff_id, name, b, c, rev, mins in staff_rows
+    ]
+    by_service = [
+        row(name, b, c, rev, mins, None)
+        for name, b, c, rev, mins in (
+            db.session.query(Service.name, *aggs)
+            .join(Service, Service.id == DailyStat.service_id)
+            .filter(*in_range)
+            .group_by(Service.id, Service.name)
+            .order_by(Service.name.asc())
+        )
+    ]
+    by_day = [
+        row(day, b, c, rev, mins, None)
+        for day, b, c, rev, mins in (
+            db.session.query(DailyStat.day, *aggs)
+            .filter(*in_range)
+            .group_by(DailyStat.day)
+            .order_by(DailyStat.day.asc())
+        )
+    ]
+
+    b, c, rev, mins = db.session.query(*aggs).filter(*in_range).one()
+    totals = row("Σύνολο", b, c, rev, mins, sum(capacity.values()))
+
+    return dict(totals=totals, by_staff=by_staff, by_service=by_service, by_day=by_day)
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting (token bucket ανά IP και ανά route)
+#
+# Ελέγχεται στο before_request, άρα ένα 429 επιστρέφεται πριν από
+# οποιοδήποτε query στη βάση ή render template.
+# Με RATE_LIMIT_URL=redis://... οι buckets μοιράζονται σε όλους τους workers.
+# ---------------------------------------------------------------------------
+
+# endpoint -> (methods, per-IP (burst, tokens/sec), ανά route συνολικά (burst, tokens/sec) ή None)
+RATE_LIMITS = {
+    "api_locations": (("GET",), (20, 5.0), (2000, 500.0)),
+    "api_availability": (("GET",), (30, 2.0), None),
+    "add_review": (("POST",), (3, 1 / 60), (60, 1.0)),
+    "book_confirm": (("POST",), (5, 1 / 30), (200, 10.0)),
+    "business": (("POST",), (3, 1 / 120), (60, 1.0)),
+}
+
+
+def _parse_limit(raw: str):
+    """"burst/per_sec" -> (burst, per_sec), π.χ. RATE_LIMIT_API_LOCATIONS=20/5 ("off" -> None)"""
+    if raw.lower() in ("0", "off", "none"):
+        return None
+    burst, per_sec = raw.split("/", 1)
+    return int(burst), float(per_sec)
+
+
+# RATE_LIMIT_<ENDPOINT> = όριο ανά IP, RATE_LIMIT_<ENDPOINT>_ROUTE = συνολικό όριο του route
+for _endpoint in list(RATE_LIMITS):
+    _methods, _per_ip, _route = RATE_LIMITS[_endpoint]
+    _raw = (os.environ.get(f"RATE_LIMIT_{_endpoint.upper()}") or "").strip()
+    if _raw:
+        _per_ip = _parse_limit(_raw) or _per_ip
+    _raw = (os.environ.get(f"RATE_LIMIT_{_endpoint.upper()}_ROUTE") or "").strip()
+    if _raw:
+        _route = _parse_limit(_raw)
+    RATE_LIMITS[_endpoint] = (_methods, _per_ip, _route)
+
+
+class TokenBuckets:
+    """Token buckets στη μνήμη: key -> [tokens, last_ts], με καθάρισμα όσων έχουν γεμίσει."""
+
+    SWEEP_EVERY = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._ops = 0
+
+    def take(self, key, burst: int, per_sec: float, now: float):
+        """Επιστρέφει 0 αν επιτρέπεται, αλλιώς δευτερόλεπτα μέχρι το επόμενο token."""
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = [float(burst), now]
+            else:
+                b[0] = min(burst, b[0] + (now - b[1]) * per_sec)
+                b[1] = now
+
+            self._ops += 1
+            if self._ops >= self.SWEEP_EVERY:
+                self._ops = 0
+                self._sweep(now)
+
+            if b[0] >= 1:
+                b[0] -= 1
+                return 0
+            return (1 - b[0]) / per_sec
+
+    def _sweep(self, now: float):
+        # ένα bucket που θα είχε ξαναγεμίσει δεν χρειάζεται να κρατιέται
+        for key, (_, last) in list(self._buckets.items()):
+            _, per_ip, per_route = RATE_LIMITS.get(key[0], ((), (1, 1.0), None))
+            burst, per_sec = per_route if (key[1] == "*" and per_route) else per_ip
+            if now - last > max(burst / per_sec, 1.0):
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisTokenBuckets:
+    """Ίδια σημασιολογία με TokenBuckets, αλλά κοινή για όλους τους workers."""
+
+    SCRIPT = """
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(math.max(burst / rate, 1)))
+return tostring(wait)
+"""
+
+    def __init__(self, client):
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, burst: int, per_sec: float, now: float):
+        return float(self._take(keys=["rl:" + ":".join(map(str, key))], args=[burst, per_sec, now]))
+
+
+def make_rate_limiter():
+    url = (os.environ.get("RATE_LIMIT_URL") or "").strip()
+    if url:
+        try:
+            import redis  # προαιρετικό (requirements-live.txt)
+            return RedisTokenBuckets(redis.Redis.from_url(url))
+        except ImportError:
+            pass
+    return TokenBuckets()
+
+
+rate_limiter = make_rate_limiter()
+RATE_LIMIT_ENABLED = (os.environ.get("RATE_LIMIT_ENABLED", "1").strip().lower() in ("1", "true", "yes"))
+# Μόνο πίσω από proxy που προσθέτει X-Forwarded-For (π.χ. Render): αλλιώς ο client
+# θα μπορούσε να βάλει ό,τι IP θέλει και να παρακάμψει το όριο ανά IP.
+RATE_LIMIT_TRUST_PROXY = (os.environ.get("RATE_LIMIT_TRUST_PROXY", "0").strip().lower() in ("1", "true", "yes"))
+
+
+def take_rate_limit(endpoint: str, ip: str, now: float) -> float:
+    """Πρώτα το bucket της IP· το κοινό bucket του route χρεώνεται μόνο για όσα περάσουν,
+    ώστε ένας client που ήδη κόβεται να μην αδειάζει το όριο όλων των άλλων."""
+    _, per_ip, per_route = RATE_LIMITS[endpoint]
+    wait = rate_limiter.take((endpoint, ip), *per_ip, now)
+    if not wait and per_route:
+        wait = rate_limiter.take((endpoint, "*"), *per_route, now)
+    return wait
+
+
+def client_ip() -> str:
+    # Στο Render (και γενικά πίσω από proxy) η πραγματική IP είναι η τελευταία
+    # που πρόσθεσε ο proxy στο X-Forwarded-For (οι πρώτες ελέγχονται από τον client).
+    if RATE_LIMIT_TRUST_PROXY:
+        fwd = request.headers.get("X-Forwarded-For", "")
+        if fwd:
+            return fwd.rsplit(",", 1)[-1].strip()
+    return request.remote_addr or "-"
+
+
+@app.before_request
+def enforce_rate_limits():
+    if not RATE_LIMIT_ENABLED:
+        return None
+    rule = RATE_LIMITS.get(request.endpoint)
+    if rule is None:
+        return None
+    if request.method not in rule[0]:
+        return None
+
+    now = time.monotonic() if isinstance(rate_limiter, TokenBuckets) else time.time()
+    try:
+        wait = take_rate_limit(request.endpoint, client_ip(), now)
+    except Exception:
+        return None  # αν πέσει το shared backend, δεν κόβουμε την κίνηση
+
+    if not wait:
+        return None
+
+    retry_after = str(max(1, int(wait + 0.999)))
+    if request.endpoint.startswith("api_"):
+        return jsonify({"error": "rate_limited"}), 429, {"Retry-After": retry_after}
+    return "Πάρα πολλά αιτήματα. Δοκίμασε ξανά σε λίγο.", 429, {"Retry-After": retry_after}
+
+
+# ---------------------------------------------------------------------------
+# Συγκρούσεις ωραρίου (ραντεβού εκτός νέου ωραρίου / ανενεργού υπαλλήλου)
+# ---------------------------------------------------------------------------
+
+BULK_CHUNK = 500
+
+def find_schedule_conflicts(shop_id: int, staff_ids=None, changed=None, appt_ids=None):
+    """Μελλοντικά ενεργά ραντεβού που δεν χωράνε πλέον στο ωράριο.
+
+    Ένα query: Appointment ⟕ StaffDayCalendar στο (staff_id, ημέρα). Για ημέρες
+    εκτός παραθύρου του ημερολογίου οι κανόνες φορτώνονται μία φορά.
+
+    changed = {(staff_id, iso_date)} από το compile_calendar: μέσα στο παράθυρο
+    ελέγχονται μόνο αυτές οι ημέρες (οι υπόλοιπες δεν άλλαξαν). appt_ids = μόνο αυτά.
+    """
+    today = date.today().isoformat()
+    horizon = (date.today() + timedelta(weeks=CALENDAR_WEEKS)).isoformat()
+    q = (
+        db.session.query(
+            Appointment.id, Appointment.staff_id, Appointment.appt_date,
+            Appointment.start_hm, Appointment.end_hm,
+            Appointment.customer_name, Appointment.phone, Appointment.customer_email,
+            Staff.name, Staff.is_active, StaffDayCalendar.intervals,
+        )
+        .join(Staff, Staff.id == Appointment.staff_id)
+        .outerjoin(StaffDayCalendar, db.and_(
+            StaffDayCalendar.staff_id == Appointment.staff_id,
+            StaffDayCalendar.day == Appointment.appt_date,
+        ))
+        .filter(Appointment.shop_id == shop_id)
+        .filter(Appointment.appt_date >= today)
+        .filter(Appointment.status != "Ακυρωμένο")
+        .order_by(Appointment.appt_date.asc(), Appointment.start_hm.asc())
+    )
+    if staff_ids is not None:
+        q = q.filter(Appointment.staff_id.in_(staff_ids))
+    if appt_ids is not None:
+        q = q.filter(Appointment.id.in_(list(appt_ids)))
+    if changed is not None:
+        q = q.filter(db.or_(
+            Appointment.appt_date > horizon,
+            db.and_(
+                Appointment.staff_id.in_({k[0] for k in changed}),
+                Appointment.appt_date.in_({k[1] for k in changed}),
+            ),
+        ))
+    rows = q.all()
+    if changed is not None:
+        rows = [r for r in rows if r[2] > horizon or (r[1], r[2]) in changed]
+    if not rows:
+        return []
+
+    rules = None
+    conflicts = []
+    for aid, staff_id, day, start_hm, end_hm, name, phone, email, staff_name, active, raw in rows:
+        if not active:
+            reason = "Ανενεργός υπάλληλος"
+        else:
+            if raw is not None:
+                intervals = decode_intervals(raw)
+            else:
+                if rules is None:
+                    ids = staff_ids if staff_ids is not None else list({r[1] for r in rows})
+                    rules = load_schedule_rules(shop_id, ids, today, rows[-1][2])
+                shop_hours, staff_hours, exceptions = rules
+                mine = [ex for ex in exceptions if ex.staff_id in (None, staff_id)]
+                intervals = day_intervals(day, shop_hours, staff_hours.get(staff_id), mine)
+            s, e = hm_to_minutes(start_hm), hm_to_minutes(end_hm)
+            if any(a <= s and e <= b for a, b in intervals):
+                continue
+            reason = "Εκτός ωραρίου" if intervals else "Κλειστό"
+        conflicts.append(dict(
+            id=aid, staff_id=staff_id, staff_name=staff_name, appt_date=day,
+            start_hm=start_hm, end_hm=end_hm, customer_name=name, phone=phone,
+            customer_email=email, reason=reason,
+        ))
+    return conflicts
+
+def _chunks(items, n: int = BULK_CHUNK):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+def bulk_cancel_appointments(shop_id: int, ids) -> int:
+    """Ακύρωση πολλών ραντεβού με batched UPDATE + ενημέρωση rollups/live slots."""
+    cancelled = []
+    for chunk in _chunks(list(ids)):
+        rows = (
+            db.session.query(
+                Appointment.id, Appointment.appt_date, Appointment.staff_id, Appointment.service_id,
+                Appointment.start_hm, Service.price_cents, Service.duration_min,
+            )
+            .join(Service, Service.id == Appointment.service_id)
+            .filter(Appointment.id.in_(chunk), Appointment.shop_id == shop_id)
+            .filter(Appointment.status != "Ακυρωμένο")
+            .with_for_update(of=Appointment)
+            .all()
+        )
+        if not rows:
+            continue
+        (
+            Appointment.query
+            .filter(Appointment.id.in_([r[0] for r in rows]))
+            .update({Appointment.status: "Ακυρωμένο"}, synchronize_session=False)
+        )
+        cancelled.extend(rows)
+
+    deltas = {}
+    for _, day, staff_id, service_id, _, price, minutes in cancelled:
+        d = deltas.setdefault((day, shop_id, staff_id, service_id), [0, 0, 0])
+        d[0] += 1
+        d[1] -= price
+        d[2] -= minutes
+    for key, (n, rev, mins) in deltas.items():
+        bump_stat_key(key, 0, n, rev, mins)
+    db.session.commit()
+
+    # Όχι "freed": η ώρα ενός ραντεβού σε σύγκρουση συνήθως είναι εκτός του νέου ωραρίου.
+    for staff_id, day in sorted({(r[2], r[1]) for r in cancelled}):
+        publish_slots_snapshot(staff_id, day)
+    return len(cancelled)
+
+def bulk_notify_conflicts(shop: Shop, conflicts):
+    """Email σε όλους τους πελάτες με μία SMTP σύνδεση. Επιστρέφει (sent, failed)."""
+    cfg = smtp_settings()
+    todo = [c for c in conflicts if c["customer_email"]]
+    if cfg is None or not todo:
+        return 0, 0
+    sent = failed = 0
+    try:
+        server = open_smtp(cfg)
+    except (smtplib.SMTPException, OSError) as e:
+        app.logger.warning("conflict notify: SMTP connect failed: %s", e)
+        return 0, len(todo)
+    with server:
+        for c in todo:
+            body = (
+                f"Γεια σου {c['customer_name']},\n\n"
+                f"Το ραντεβού σου στο {shop.name} στις {c['appt_date']} {c['start_hm']} "
+                f"({c['staff_name']}) επηρεάζεται από αλλαγή ωραρίου.\n"
+                f"Θα επικοινωνήσουμε μαζί σου για νέα ώρα. Τηλ.: {shop.phone or '-'}\n\n"
+                f"Σε ευχαριστούμε!"
+            )
+            try:
+                server.send_message(make_email(cfg, c["customer_email"], "Αλλαγή ραντεβού – ehairstyle", body))
+                sent += 1
+            except (smtplib.SMTPException, OSError):
+                failed += 1
+    return sent, failed
+
+def redirect_if_conflicts(shop_id: int, staff_ids=None, changed=None):
+    """Μετά από αλλαγή ωραρίου: αν υπάρχουν συγκρούσεις, πήγαινε στην αναφορά."""
+    n = len(find_schedule_conflicts(shop_id, staff_ids, changed))
+    if not n:
+        return None
+    flash(f"⚠️ {n} μελλοντικά ραντεβού δεν χωράνε πλέον στο ωράριο.", "warning")
+    return redirect(url_for("admin_conflicts", sid=shop_id))
+
+
+# ---------------------------------------------------------------------------
+# Profiling & slow-request log
+#
+# Κάθε request μετράει SQL (πλήθος/χρόνο ανά statement) και χρόνο templates.
+# - Πάνω από SLOW_REQUEST_MS γράφεται μία γραμμή στο SlowRequest.
+# - Ο admin μπορεί να ζητήσει πλήρες cProfile για ένα request με
+#   ?_profile=1 ή header "X-Profile: 1". Το report σώζεται στο PROFILE_DIR
+#   και κατεβαίνει από /admin/profiles.
+# ---------------------------------------------------------------------------
+
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS") or "1000")
+PROFILE_DIR = (os.environ.get("PROFILE_DIR") or "").strip() or os.path.join(app.instance_path, "profiles")
+PROFILE_KEEP = 50
+SECRET_FIELDS = ("password",)
+# Ο cProfile είναι ένας για όλο το process (3.12+: sys.monitoring): ένα profile τη φορά.
+PROFILE_LOCK = threading.Lock()
+
+
+def _on_before_execute(conn, cursor, statement, parameters, context, executemany):
+    # ανά statement (όχι στοίβα στο conn.info): αν το statement αποτύχει, το
+    # after_cursor_execute δεν τρέχει και δεν μένει τίποτα πίσω στο pooled connection
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _on_after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None or not has_request_context() or "sql" not in g:
+        return
+    g.sql.append((statement, time.perf_counter() - started))
+
+
+def _on_before_render(sender, template, context, **extra):
+    if has_request_context() and "template_t0" in g:
+        g.template_t0.append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    if has_request_context() and g.get("template_t0"):
+        g.templates.append((template.name, time.perf_counter() - g.template_t0.pop()))
+
+
+def install_request_instrumentation():
+    event.listen(db.engine, "before_cursor_execute", _on_before_execute)
+    event.listen(db.engine, "after_cursor_execute", _on_after_execute)
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
+
+
+def sql_breakdown(sql, limit: int = 10):
+    by_stmt = {}
+    for stmt, sec in sql:
+        key = " ".join(stmt.split())[:300]
+        agg = by_stmt.setdefault(key, [0, 0.0])
+        agg[0] += 1
+        agg[1] += sec
+    rows = sorted(by_stmt.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+    return [dict(sql=k, count=n, ms=round(sec * 1000, 2)) for k, (n, sec) in rows]
+
+
+def request_params() -> dict:
+    return dict(
+        args={k: ("***" if k in SECRET_FIELDS else v) for k, v in request.args.items()},
+        view_args=request.view_args or {},
+        form_fields=sorted(request.form.keys()) if request.method == "POST" else [],
+    )
+
+
+@app.before_request
+def start_request_instrumentation():
+    g.t0 = time.perf_counter()
+    g.sql = []
+    g.templates = []
+    g.template_t0 = []
+    g.profiler = None
+    wants = request.args.get("_profile") == "1" or request.headers.get("X-Profile") == "1"
+    if wants and admin_required():
+        if not PROFILE_LOCK.acquire(blocking=False):
+            g.profile_skipped = "busy"  # τρέχει ήδη άλλο profile: σερβίρουμε κανονικά
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # άλλο εργαλείο profiling ενεργό στο process
+            PROFILE_LOCK.release()
+            g.profile_skipped = "busy"
+            return
+        g.profiler = profiler
+
+
+def stop_profiler():
+    profiler, g.profiler = g.get("profiler"), None
+    if profiler is not None:
+        try:
+            profiler.disable()
+        finally:
+            PROFILE_LOCK.release()
+    return profiler
+
+
+@app.after_request
+def finish_request_instrumentation(response):
+    if "t0" not in g:
+        return response
+    elapsed = time.perf_counter() - g.t0
+    profiler = stop_profiler()
+    if profiler is not None:
+        name = save_profile_report(profiler, elapsed)
+        response.headers["X-Profile-Report"] = url_for("admin_profile_download", name=name)
+    elif g.get("profile_skipped"):
+        response.headers["X-Profile-Skipped"] = g.profile_skipped
+    if elapsed * 1000 >= SLOW_REQUEST_MS and not response.is_streamed:
+        log_slow_request(response, elapsed)
+    return response
+
+
+@app.teardown_request
+def release_request_profiler(exc):
+    # αν δεν έτρεξε το after_request (π.χ. exception), να μη μείνει κλειδωμένο το profiling
+    if g.get("profiler") is not None:
+        stop_profiler()
+
+
+def save_profile_report(profiler, elapsed: float) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{request.endpoint or 'unknown'}-{os.getpid()}.txt"
+
+    out = io.StringIO()
+    out.write(f"{request.method} {request.full_path}\n")
+    out.write(f"endpoint: {request.endpoint}\n")
+    out.write(f"total: {elapsed * 1000:.1f} ms\n")
+    out.write(f"params: {json.dumps(request_params(), ensure_ascii=False)}\n\n")
+
+    sql_total = sum(sec for _, sec in g.sql)
+    out.write(f"== SQL: {len(g.sql)} statements, {sql_total * 1000:.1f} ms ==\n")
+    for stmt, sec in g.sql:
+        out.write(f"{sec * 1000:8.2f} ms  {' '.join(stmt.split())}\n")
+
+    out.write("\n== Templates ==\n")
+    for tpl, sec in g.templates:
+        out.write(f"{sec * 1000:8.2f} ms  {tpl}\n")
+
+    out.write("\n== cProfile (cumulative, top 60) ==\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+
+    # κρατάμε μόνο τα τελευταία PROFILE_KEEP
+    for old in sorted(os.listdir(PROFILE_DIR))[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        except OSError:
+            pass
+    return name
+
+
+def log_slow_request(response, elapsed: float):
+    sql = list(g.sql)
+    row = dict(
+        created_at=datetime.utcnow(),
+        method=request.method,
+        path=request.path[:300],
+        endpoint=request.endpoint,
+        status=response.status_code,
+        duration_ms=int(elapsed * 1000),
+        params=json.dumps(request_params(), ensure_ascii=False),
+        sql_count=len(sql),
+        sql_ms=int(sum(sec for _, sec in sql) * 1000),
+        sql_breakdown=json.dumps(sql_breakdown(sql), ensure_ascii=False),
+        template_ms=int(sum(sec for _, sec in g.templates) * 1000),
+    )
+    g.pop("sql", None)  # να μη μετρηθεί το ίδιο το insert
+    engine = db.engine
+
+    def store():
+        try:
+            # ξεχωριστή σύνδεση: δεν αγγίζει το session/transaction του request
+            with engine.begin() as conn:
+                conn.execute(SlowRequest.__table__.insert(), row)
+        except Exception:
+            app.logger.warning("slow request (not stored): %s", row)
+
+    # Μετά το τέλος του request, ώστε το write να μην περιμένει (SQLite lock)
+    # τυχόν ανοιχτό transaction του session του ίδιου request.
+    response.call_on_close(store)
+
+
 def seed_demo_data():
     """Create tables and insert demo data once.
 
@@ -260,11 +1598,13 @@ def seed_demo_data():
     db.session.add_all(sv)
     db.session.commit()
 
-    # Ωράριο υπαλλήλων: Δευ-Σαβ 10:00-18:00 (0=Δευ ... 6=Κυρ)
+    # Ωράριο υπαλλήλων: Δευ-Σαβ 10:00-18:00, Κυρ ρητά κλειστή (0=Δευ ... 6=Κυρ)
     def add_staff_hours(staff_obj):
-        for wd in [0, 1, 2, 3, 4, 5]:
+        for wd in range(7):
+            open_day = wd < 6
             db.session.add(
-                StaffHours(staff_id=staff_obj.id, weekday=wd, start_hm="10:00", end_hm="18:00")
+                StaffHours(staff_id=staff_obj.id, weekday=wd,
+                           start_hm="10:00" if open_day else "", end_hm="18:00" if open_day else "")
             )
 
     add_staff_hours(st1)
@@ -282,7 +1622,7 @@ def seed_demo_data():
 
 
 
-def send_booking_email(to_email: str, appt: Appointment, shop: Shop, staff: Staff, service: Service):
+def smtp_settings():
     host = (os.environ.get("SMTP_HOST") or "").strip()
     user = (os.environ.get("SMTP_USER") or "").strip()
     password = (os.environ.get("SMTP_PASS") or "").strip()
@@ -290,8 +1630,35 @@ def send_booking_email(to_email: str, appt: Appointment, shop: Shop, staff: Staf
     port = int(os.environ.get("SMTP_PORT") or "587")
     use_tls = (os.environ.get("SMTP_TLS", "1").strip().lower() in ("1", "true", "yes"))
 
-    # Αν δεν έχεις ρυθμίσει SMTP στο Render, απλά δεν στέλνει (χωρίς να σπάει το booking)
-    if not host or not user or not password or not from_email:
+    # Αν δεν έχεις ρυθμίσει SMTP στο Render, απλά δεν στέλνει (χωρίς να σπάει το booking).
+    # Χωρίς SMTP_USER/SMTP_PASS (αλλά με SMTP_FROM) στέλνει χωρίς login, π.χ. σε τοπικό SMTP.
+    if not host or not from_email or bool(user) != bool(password):
+        return None
+    return dict(host=host, port=port, user=user, password=password, from_email=from_email, use_tls=use_tls)
+
+
+def open_smtp(cfg: dict) -> smtplib.SMTP:
+    """Μία σύνδεση για πολλά μηνύματα (bulk αποστολές)."""
+    server = smtplib.SMTP(cfg["host"], cfg["port"])
+    if cfg["use_tls"]:
+        server.starttls()
+    if cfg["user"]:
+        server.login(cfg["user"], cfg["password"])
+    return server
+
+
+def make_email(cfg: dict, to_email: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = cfg["from_email"]
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+def send_booking_email(to_email: str, appt: Appointment, shop: Shop, staff: Staff, service: Service):
+    cfg = smtp_settings()
+    if cfg is None:
         return
 
     subject = "Επιβεβαίωση κράτησης – ehairstyle"
@@ -307,25 +1674,228 @@ def send_booking_email(to_email: str, appt: Appointment, shop: Shop, staff: Staf
         f"Σε ευχαριστούμε!"
     )
 
-    msg = EmailMessage()
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.set_content(body)
+    with open_smtp(cfg) as server:
+        server.send_message(make_email(cfg, to_email, subject, body))
+
+
+
+# ---------------------------------------------------------------------------
+# Υπενθυμίσεις ραντεβού
+#
+# `flask --app app send-reminders --loop` (ξεχωριστό process / cron).
+# Για κάθε παράθυρο (REMINDER_WINDOWS, π.χ. "24h,2h") βρίσκει με ένα range
+# query στο (appt_date, start_hm) τα ραντεβού χωρίς υπενθύμιση, τα "κλειδώνει"
+# με INSERT ... ON CONFLICT DO NOTHING σε batches (άρα δύο workers δεν στέλνουν
+# ποτέ το ίδιο) και τα στέλνει από μία SMTP σύνδεση ανά batch.
+# ---------------------------------------------------------------------------
 
-    with smtplib.SMTP(host, port) as server:
-        if use_tls:
-            server.starttls()
-        server.login(user, password)
-        server.send_message(msg)
+REMINDER_BATCH = int(os.environ.get("REMINDER_BATCH") or "200")
+REMINDER_INTERVAL_SEC = int(os.environ.get("REMINDER_INTERVAL_SEC") or "60")
+REMINDER_MAX_ATTEMPTS = 3
+REMINDER_STALE_CLAIM = timedelta(minutes=10)
+APP_TZ = (os.environ.get("APP_TZ") or "Europe/Athens").strip()
 
 
+def reminder_windows():
+    """[("24h", 24h), ("2h", 2h)] ταξινομημένα από το μεγαλύτερο."""
+    out = []
+    for part in (os.environ.get("REMINDER_WINDOWS") or "24h,2h").split(","):
+        part = part.strip().lower()
+        if part.endswith("h") and part[:-1].isdigit():
+            out.append((part, timedelta(hours=int(part[:-1]))))
+        elif part.endswith("m") and part[:-1].isdigit():
+            out.append((part, timedelta(minutes=int(part[:-1]))))
+    return sorted(out, key=lambda kv: kv[1], reverse=True)
+
+
+def local_now() -> datetime:
+    # τα ραντεβού αποθηκεύονται σε τοπική ώρα καταστήματος (naive)
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(APP_TZ)).replace(tzinfo=None)
+    except Exception:
+        return datetime.now()
+
+
+def starts_between(lo: datetime, hi: datetime):
+    """(lo, hi] πάνω στο (appt_date, start_hm), ώστε να χρησιμοποιεί το index."""
+    lo_d, lo_t = lo.date().isoformat(), lo.strftime("%H:%M")
+    hi_d, hi_t = hi.date().isoformat(), hi.strftime("%H:%M")
+    return db.and_(
+        Appointment.appt_date >= lo_d,
+        Appointment.appt_date <= hi_d,
+        db.or_(Appointment.appt_date > lo_d, Appointment.start_hm > lo_t),
+        db.or_(Appointment.appt_date < hi_d, Appointment.start_hm <= hi_t),
+    )
+
+
+def starts_after(now: datetime):
+    """Ραντεβού που δεν έχουν ξεκινήσει ακόμα (appt_date, start_hm) > now."""
+    d, t = now.date().isoformat(), now.strftime("%H:%M")
+    return db.or_(Appointment.appt_date > d, db.and_(Appointment.appt_date == d, Appointment.start_hm > t))
+
+
+def claim_reminders(kind: str, lo: datetime, hi: datetime, now: datetime, token: str) -> int:
+    """Κλειδώνει έως REMINDER_BATCH ραντεβού για αυτό το παράθυρο. Επιστρέφει πόσα πήρε *αυτός* ο worker."""
+    pending = (
+        db.session.query(
+            Appointment.id,
+            db.literal(kind),
+            db.literal(token),
+            db.literal(now),
+            db.literal(0),
+        )
+        .filter(Appointment.status != "Ακυρωμένο")
+        .filter(starts_between(lo, hi))
+        .filter(~db.exists().where(db.and_(
+            AppointmentReminder.appointment_id == Appointment.id,
+            AppointmentReminder.kind == kind,
+        )))
+        .order_by(Appointment.appt_date.asc(), Appointment.start_hm.asc())
+        .limit(REMINDER_BATCH)
+    )
+    cols = ["appointment_id", "kind", "claim_token", "claimed_at", "attempts"]
+
+    upsert_insert = dialect_upsert_insert()
+    if upsert_insert is not None:
+        stmt = upsert_insert(AppointmentReminder).from_select(cols, pending).on_conflict_do_nothing()
+        db.session.execute(stmt)
+    else:
+        for row in pending.all():
+            try:
+                with db.session.begin_nested():
+                    db.session.add(AppointmentReminder(**dict(zip(cols, row))))
+            except IntegrityError:
+                continue
+    db.session.commit()
+    return AppointmentReminder.query.filter_by(claim_token=token, sent_at=None).count()
+
+
+def reclaim_stale_reminders(now: datetime, token: str):
+    """Claims που έμειναν χωρίς αποστολή (π.χ. έπεσε ο worker ή το SMTP) ξαναπαίρνονται με ένα UPDATE,
+    μόνο αν το ραντεβού δεν έχει ξεκινήσει ακόμα."""
+    (
+        AppointmentReminder.query
+        .filter(AppointmentReminder.sent_at.is_(None))
+        .filter(AppointmentReminder.claimed_at < now - REMINDER_STALE_CLAIM)
+        .filter(AppointmentReminder.attempts < REMINDER_MAX_ATTEMPTS)
+        .filter(AppointmentReminder.appointment_id.in_(
+            db.session.query(Appointment.id).filter(starts_after(now))
+        ))
+        .update({AppointmentReminder.claim_token: token, AppointmentReminder.claimed_at: now},
+                synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def reminder_body(appt: Appointment, shop: Shop, staff: Staff, service: Service) -> str:
+    return (
+        f"Υπενθύμιση ραντεβού\n\n"
+        f"Κατάστημα: {shop.name}\n"
+        f"Υπηρεσία: {service.name}\n"
+        f"Υπάλληλος: {staff.name}\n"
+        f"Ημερομηνία: {appt.appt_date}\n"
+        f"Ώρα: {appt.start_hm} - {appt.end_hm}\n"
+        f"Διεύθυνση: {shop.address or '-'} • Τηλ.: {shop.phone or '-'}\n\n"
+        f"Αν δεν μπορείς να έρθεις, ενημέρωσέ μας. Σε ευχαριστούμε!"
+    )
+
+
+def deliver_claimed_reminders(token: str, now: datetime, cfg: dict) -> int:
+    rows = (
+        db.session.query(AppointmentReminder, Appointment, Shop, Staff, Service)
+        .join(Appointment, Appointment.id == AppointmentReminder.appointment_id)
+        .join(Shop, Shop.id == Appointment.shop_id)
+        .join(Staff, Staff.id == Appointment.staff_id)
+        .join(Service, Service.id == Appointment.service_id)
+        .filter(AppointmentReminder.claim_token == token, AppointmentReminder.sent_at.is_(None))
+        .all()
+    )
+    if not rows:
+        return 0
+
+    sent_ids, failed = [], {}
+    skip_ids = [rem.id for rem, appt, *_ in rows if appt.status == "Ακυρωμένο" or not appt.customer_email]
+    todo = [row for row in rows if row[0].id not in skip_ids]
+    try:
+        with open_smtp(cfg) as server:
+            for rem, appt, shop, staff, service in todo:
+                msg = make_email(cfg, appt.customer_email, "Υπενθύμιση ραντεβού – ehairstyle",
+                                 reminder_body(appt, shop, staff, service))
+                try:
+                    server.send_message(msg)
+                    sent_ids.append(rem.id)
+                except smtplib.SMTPException as e:
+                    failed[rem.id] = str(e)[:300]
+    except (smtplib.SMTPException, OSError) as e:
+        # connect/login απέτυχε ή έπεσε η σύνδεση: ό,τι δεν στάλθηκε μετράει ως
+        # αποτυχημένη προσπάθεια και ξαναπαίρνεται από το reclaim_stale_reminders
+        for rem, *_ in todo:
+            if rem.id not in sent_ids:
+                failed.setdefault(rem.id, str(e)[:300])
+        raise
+    finally:
+        # ό,τι στάλθηκε σημειώνεται πάντα, ώστε να μη ξανασταλεί μετά από σφάλμα
+        for chunk in _chunks(sent_ids + skip_ids):
+            (
+                AppointmentReminder.query.filter(AppointmentReminder.id.in_(chunk))
+                .update({AppointmentReminder.sent_at: now}, synchronize_session=False)
+            )
+        for rem_id, err in failed.items():
+            (
+                AppointmentReminder.query.filter_by(id=rem_id)
+                .update({AppointmentReminder.attempts: AppointmentReminder.attempts + 1,
+                         AppointmentReminder.last_error: err}, synchronize_session=False)
+            )
+        db.session.commit()
+    return len(sent_ids)
+
+
+def run_reminders(now: datetime = None) -> int:
+    """Ένα πέρασμα για όλα τα παράθυρα. `now` για tests (ελεγχόμενο ρολόι)."""
+    cfg = smtp_settings()
+    if cfg is None:
+        return 0
+    now = now or local_now()
+
+    token = str(uuid.uuid4())
+    reclaim_stale_reminders(now, token)
+    sent = deliver_claimed_reminders(token, now, cfg)
+
+    windows = reminder_windows()
+    for i, (kind, ahead) in enumerate(windows):
+        # κάθε παράθυρο καλύπτει (επόμενο μικρότερο, ahead] για να μη στέλνονται δύο μαζί
+        lower = windows[i + 1][1] if i + 1 < len(windows) else timedelta(0)
+        while True:
+            token = str(uuid.uuid4())
+            if not claim_reminders(kind, now + lower, now + ahead, now, token):
+                break
+            sent += deliver_claimed_reminders(token, now, cfg)
+    return sent
+
+
+@app.cli.command("send-reminders")
+@click.option("--loop", is_flag=True, help="Τρέχει συνέχεια, κάθε REMINDER_INTERVAL_SEC.")
+def send_reminders_command(loop: bool):
+    """flask --app app send-reminders [--loop]"""
+    while True:
+        try:
+            n = run_reminders()
+            print(f"sent {n} reminders")
+        except Exception as e:
+            db.session.rollback()
+            print(f"reminders failed: {e}")
+        if not loop:
+            break
+        db.session.remove()
+        time.sleep(REMINDER_INTERVAL_SEC)
+
 
 with app.app_context():
     ensure_schema()
     seed_demo_data()
+    install_request_instrumentation()
 
-from flask import jsonify
 
 LOCATIONS = [
     "Χανιά", "Ρέθυμνο", "Ηράκλειο", "Άγιος Νικόλαος",
@@ -334,29 +1904,46 @@ LOCATIONS = [
     "Χαλκίδα", "Χαλάνδρι", "Χαϊδάρι"
 ]
 
+_GR_TONOS = str.maketrans({
+    "ά":"α","έ":"ε","ή":"η","ί":"ι","ό":"ο","ύ":"υ","ώ":"ω",
+    "Ά":"α","Έ":"ε","Ή":"η","Ί":"ι","Ό":"ο","Ύ":"υ","Ώ":"ω",
+    "ϊ":"ι","ΐ":"ι","ϋ":"υ","ΰ":"υ"
+})
+
 def _normalize_gr(s: str) -> str:
     # απλό “χωρίς τόνους”
-    table = str.maketrans({
-        "ά":"α","έ":"ε","ή":"η","ί":"ι","ό":"ο","ύ":"υ","ώ":"ω",
-        "Ά":"α","Έ":"ε","Ή":"η","Ί":"ι","Ό":"ο","Ύ":"υ","Ώ":"ω",
-        "ϊ":"ι","ΐ":"ι","ϋ":"υ","ΰ":"υ"
-    })
-    return (s or "").translate(table).lower()
+    return (s or "").translate(_GR_TONOS).lower()
 
-@app.get("/api/locations")
-def api_locations():
-    q = (request.args.get("q") or "").strip()
+_LOCATIONS_NORM = [(_normalize_gr(loc), loc) for loc in LOCATIONS]
+
+def location_matches(q: str):
+    """Autocomplete πόλεων (κοινό για το Flask και το async app)."""
+    q = (q or "").strip()
     if len(q) < 2:
-        return jsonify([])
+        return []
 
     nq = _normalize_gr(q)
 
     matches = []
-    for loc in LOCATIONS:
-        if nq in _normalize_gr(loc):
+    for norm, loc in _LOCATIONS_NORM:
+        if nq in norm:
             matches.append({"label": f"{loc} Ελλάδα", "value": loc})
 
-    return jsonify(matches[:10])
+    return matches[:10]
+
+@app.get("/api/locations")
+def api_locations():
+    return jsonify(location_matches(request.args.get("q")))
+
+@app.get("/api/availability")
+def api_availability():
+    staff_id = request.args.get("staff_id", type=int) or 0
+    iso_date = (request.args.get("date") or "").strip()
+    try:
+        weekday_of(iso_date)
+    except Exception:
+        return jsonify({"error": "date"}), 400
+    return jsonify({"staff_id": staff_id, "date": iso_date, "slots": available_slots(staff_id, iso_date, 30)})
 
 
 
@@ -476,6 +2063,10 @@ def book_step3(sid: int):
     staff = Staff.query.filter_by(shop_id=sid, is_active=True).order_by(Staff.name.asc()).all()
 
     if request.method == "POST":
+        if request.form.get("staff_id") == ANY_STAFF:
+            st["staff_id"] = ANY_STAFF
+            session.modified = True
+            return redirect(url_for("book_step4", sid=sid))
         staff_id = int(request.form.get("staff_id") or 0)
         s = Staff.query.filter_by(id=staff_id, shop_id=sid).first()
         if not s:
@@ -529,9 +2120,12 @@ def book_step4(sid: int):
         return redirect(url_for("book_step3", sid=sid))
 
     service = Service.query.get(st["service_id"])
-    staff = Staff.query.get(st["staff_id"])
-    slots = available_slots(staff.id, st["appt_date"], 30)
-
+    if st["staff_id"] == ANY_STAFF:
+        staff = None
+        slots = any_staff_slots(shop_day_availability(sid, st["appt_date"]))
+    else:
+        staff = Staff.query.get(st["staff_id"])
+        slots = available_slots(staff.id, st["appt_date"], 30)
 
     if request.method == "POST":
         hm = (request.form.get("start_hm") or "").strip()
@@ -543,7 +2137,52 @@ def book_step4(sid: int):
         session.modified = True
         return redirect(url_for("book_confirm", sid=sid))
 
-    return render_template("book_step4.html", app_name=APP_NAME, shop=shop, staff=staff, service=service, slots=slots, st=st, cents_to_eur=cents_to_eur)
+    return render_template("book_step4.html", app_name=APP_NAME, shop=shop, staff=staff, service=service, slots=slots, st=st, cents_to_eur=cents_to_eur, live_slots=live_slots_enabled())
+
+@app.route("/book/<int:sid>/slots/stream", methods=["GET"])
+def book_slots_stream(sid: int):
+    if not live_slots_enabled():
+        return {"error": "live_slots_disabled"}, 404
+    staff_id = request.args.get("staff_id", type=int) or 0
+    iso_date = (request.args.get("date") or "").strip()
+    staff = Staff.query.filter_by(id=staff_id, shop_id=sid).first()
+    if not staff:
+        return {"error": "staff"}, 404
+    try:
+        weekday_of(iso_date)
+    except Exception:
+        return {"error": "date"}, 400
+
+    # subscribe πριν το snapshot ώστε να μη χαθεί event ανάμεσα
+    q = slot_broker.subscribe(staff_id, iso_date)
+    slots = available_slots(staff_id, iso_date, 30)
+    # Η σύνδεση μένει ανοιχτή πολύ ώρα: δεν κρατάμε DB connection.
+    db.session.remove()
+
+    def gen():
+        # Κλείνει μετά από SSE_MAX_LIFETIME_SEC· ο browser ξανασυνδέεται (retry) και παίρνει νέο snapshot.
+        deadline = time.monotonic() + SSE_MAX_LIFETIME_SEC
+        try:
+            yield "retry: 5000\n\n"
+            yield sse_format("snapshot", {"slots": slots})
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return
+                try:
+                    ev = q.get(timeout=min(SSE_HEARTBEAT_SEC, left))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield sse_format(ev["type"], ev)
+        finally:
+            slot_broker.unsubscribe(staff_id, iso_date, q)
+
+    return Response(
+        gen(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.route("/book/<int:sid>/confirm", methods=["GET", "POST"])
 def book_confirm(sid: int):
@@ -553,7 +2192,7 @@ def book_confirm(sid: int):
         return redirect(url_for("book_step4", sid=sid))
 
     service = Service.query.get(st["service_id"])
-    staff = Staff.query.get(st["staff_id"])
+    staff = None if st["staff_id"] == ANY_STAFF else Staff.query.get(st["staff_id"])
 
     if request.method == "POST":
         name = (request.form.get("name") or "").strip()
@@ -579,27 +2218,44 @@ def book_confirm(sid: int):
             return redirect(url_for("book_confirm", sid=sid))
 
         # re-check
-        slots = available_slots(staff.id, st["appt_date"], service.duration_min)
-        if st["start_hm"] not in slots:
+        if staff is None:
+            # "Οποιοσδήποτε": πρώτα ο λιγότερο φορτωμένος υπάλληλος της ημέρας
+            candidates = rank_staff_for_slot(shop_day_availability(sid, st["appt_date"]), st["start_hm"])
+        else:
+            slots = available_slots(staff.id, st["appt_date"], service.duration_min)
+            candidates = [staff.id] if st["start_hm"] in slots else []
+
+        appt = None
+        for staff_id in candidates:
+            cand = Appointment(
+                shop_id=sid,
+                staff_id=staff_id,
+                service_id=service.id,
+                appt_date=st["appt_date"],
+                start_hm=st["start_hm"],
+                end_hm=st["end_hm"],
+                customer_name=name,
+                phone=phone,
+                notes=notes,
+                payment_method=payment,
+                status="Νέο",
+                customer_email=email,
+
+            )
+            # το unique index κάνει την ανάθεση atomic: αν ο υπάλληλος μόλις
+            # κλείστηκε από άλλο request, δοκιμάζουμε τον επόμενο
+            if insert_appointment(cand):
+                appt = cand
+                break
+
+        if appt is None:
             flash("Η ώρα μόλις έγινε μη διαθέσιμη. Διάλεξε άλλη.", "warning")
             return redirect(url_for("book_step4", sid=sid))
 
-        appt = Appointment(
-            shop_id=sid,
-            staff_id=staff.id,
-            service_id=service.id,
-            appt_date=st["appt_date"],
-            start_hm=st["start_hm"],
-            end_hm=st["end_hm"],
-            customer_name=name,
-            phone=phone,
-            notes=notes,
-            payment_method=payment,
-            status="Νέο",
-            customer_email=email,
-
-        )
-        db.session.add(appt); db.session.commit()
+        staff = staff or Staff.query.get(appt.staff_id)
+        bump_daily_stat(appt, service, bookings=1)
+        db.session.commit()
+        slot_broker.publish(appt.staff_id, appt.appt_date, {"type": "taken", "start_hm": appt.start_hm})
         try:
             send_booking_email(email, appt, shop, staff, service)
         except Exception:
@@ -673,20 +2329,22 @@ def admin_shop_hours_save(sid: int):
         return redirect(url_for("admin_login"))
 
     shop = Shop.query.get_or_404(sid)
+    hours = parse_week_hours(request.form)
+    if hours is None:
+        flash("Μη έγκυρες ώρες (HH:MM, η λήξη μετά την έναρξη).", "danger")
+        return redirect(url_for("admin_dashboard", shop_id=sid))
 
     # καθάρισμα παλιών
     ShopHours.query.filter_by(shop_id=sid).delete()
 
     # 0..6
-    for wd in range(7):
-        start = (request.form.get(f"start_{wd}") or "").strip()
-        end = (request.form.get(f"end_{wd}") or "").strip()
-        if start and end:
-            db.session.add(ShopHours(shop_id=sid, weekday=wd, start_hm=start, end_hm=end))
+    for wd, (start, end) in hours.items():
+        db.session.add(ShopHours(shop_id=sid, weekday=wd, start_hm=start, end_hm=end))
 
+    changed = compile_calendar(sid)
     db.session.commit()
     flash("✅ Αποθηκεύτηκε το ωράριο καταστήματος.", "success")
-    return redirect(url_for("admin_dashboard", shop_id=sid))
+    return redirect_if_conflicts(sid, changed=changed) or redirect(url_for("admin_dashboard", shop_id=sid))
 
 
 @app.route("/admin/shops/new", methods=["POST"])
@@ -747,8 +2405,14 @@ def admin_staff_new():
         flash("Δώσε κατάστημα και όνομα υπαλλήλου.", "danger"); return redirect(url_for("admin_dashboard"))
     st = Staff(shop_id=shop_id, name=name, title=title, is_active=True)
     db.session.add(st); db.session.commit()
-    for wd in [1,2,3,4,5]:
-        db.session.add(StaffHours(staff_id=st.id, weekday=wd, start_hm="10:00", end_hm="18:00"))
+    # αρχικό ωράριο = ωράριο καταστήματος (αλλάζει από /admin/hours/<staff_id>),
+    # και για τις 7 ημέρες ώστε οι κλειστές να είναι ρητές
+    shop_hours = {h.weekday: h for h in ShopHours.query.filter_by(shop_id=shop_id).all()}
+    for wd in range(7):
+        h = shop_hours.get(wd)
+        db.session.add(StaffHours(staff_id=st.id, weekday=wd,
+                                  start_hm=h.start_hm if h else "", end_hm=h.end_hm if h else ""))
+    compile_calendar(shop_id, [st.id])
     db.session.commit()
     flash("✅ Προστέθηκε υπάλληλος.", "success")
     return redirect(url_for("admin_dashboard", shop_id=shop_id))
@@ -814,7 +2478,15 @@ def admin_delete_shop(sid: int):
         )
     ).delete(synchronize_session=False)
 
+    AppointmentReminder.query.filter(
+        AppointmentReminder.appointment_id.in_(
+            db.session.query(Appointment.id).filter(Appointment.shop_id == sid)
+        )
+    ).delete(synchronize_session=False)
     Appointment.query.filter_by(shop_id=sid).delete(synchronize_session=False)
+    DailyStat.query.filter_by(shop_id=sid).delete(synchronize_session=False)
+    StaffDayCalendar.query.filter_by(shop_id=sid).delete(synchronize_session=False)
+    ScheduleException.query.filter_by(shop_id=sid).delete(synchronize_session=False)
     Review.query.filter_by(shop_id=sid).delete(synchronize_session=False)
     Service.query.filter_by(shop_id=sid).delete(synchronize_session=False)
     Staff.query.filter_by(shop_id=sid).delete(synchronize_session=False)
@@ -834,27 +2506,221 @@ def admin_hours(staff_id: int):
     hours = StaffHours.query.filter_by(staff_id=staff_id).order_by(StaffHours.weekday.asc()).all()
 
     if request.method == "POST":
+        week = parse_week_hours(request.form)
+        if week is None:
+            flash("Μη έγκυρες ώρες (HH:MM, η λήξη μετά την έναρξη).", "danger")
+            return redirect(url_for("admin_hours", staff_id=staff_id))
         StaffHours.query.filter_by(staff_id=staff_id).delete()
         for wd in range(7):
-            start = (request.form.get(f"start_{wd}") or "").strip()
-            end = (request.form.get(f"end_{wd}") or "").strip()
-            if start and end:
-                db.session.add(StaffHours(staff_id=staff_id, weekday=wd, start_hm=start, end_hm=end))
+            # κλειστή: αποθηκεύεται ρητά ("", ""), αλλιώς 7 κενές = ωράριο καταστήματος
+            start, end = week.get(wd, ("", ""))
+            db.session.add(StaffHours(staff_id=staff_id, weekday=wd, start_hm=start, end_hm=end))
+        changed = compile_calendar(staff.shop_id, [staff_id])
         db.session.commit()
         flash("✅ Αποθηκεύτηκε ωράριο.", "success")
-        return redirect(url_for("admin_dashboard"))
+        return redirect_if_conflicts(staff.shop_id, [staff_id], changed) or redirect(url_for("admin_dashboard"))
 
     return render_template("admin_hours.html", app_name=APP_NAME, staff=staff, shop=shop, hours=hours)
 
+@app.route("/admin/shop/<int:sid>/exceptions", methods=["GET", "POST"])
+def admin_exceptions(sid: int):
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    shop = Shop.query.get_or_404(sid)
+    staff = Staff.query.filter_by(shop_id=sid, is_active=True).order_by(Staff.name.asc()).all()
+
+    if request.method == "POST":
+        staff_id = int(request.form.get("staff_id") or 0) or None
+        date_from = (request.form.get("date_from") or "").strip() or None
+        date_to = (request.form.get("date_to") or "").strip() or date_from
+        weekday = request.form.get("weekday", type=int)
+        start = (request.form.get("start_hm") or "").strip() or None
+        end = (request.form.get("end_hm") or "").strip() or None
+        note = (request.form.get("note") or "").strip()
+
+        try:
+            for d in (date_from, date_to):
+                if d:
+                    date.fromisoformat(d)
+            if bool(start) != bool(end):
+                raise ValueError
+            if start and (not valid_hm(start) or not valid_hm(end) or hm_to_minutes(end) <= hm_to_minutes(start)):
+                raise ValueError
+        except ValueError:
+            flash("Μη έγκυρες ημερομηνίες/ώρες.", "danger")
+            return redirect(url_for("admin_exceptions", sid=sid))
+        if staff_id and not Staff.query.filter_by(id=staff_id, shop_id=sid).first():
+            flash("Διάλεξε υπάλληλο.", "danger")
+            return redirect(url_for("admin_exceptions", sid=sid))
+        if weekday is not None and not 0 <= weekday <= 6:
+            weekday = None
+        if not date_from and weekday is None:
+            flash("Δώσε ημερομηνία ή ημέρα της εβδομάδας.", "danger")
+            return redirect(url_for("admin_exceptions", sid=sid))
+
+        ex = ScheduleException(
+            shop_id=sid, staff_id=staff_id, date_from=date_from, date_to=date_to,
+            weekday=weekday, start_hm=start, end_hm=end, note=note
+        )
+        db.session.add(ex)
+        changed = compile_calendar(sid, [staff_id] if staff_id else None, ex.date_from, ex.date_to)
+        db.session.commit()
+        flash("✅ Αποθηκεύτηκε η εξαίρεση.", "success")
+        return (redirect_if_conflicts(sid, [staff_id] if staff_id else None, changed)
+                or redirect(url_for("admin_exceptions", sid=sid)))
+
+    exceptions = (
+        ScheduleException.query.filter_by(shop_id=sid)
+        .filter(db.or_(ScheduleException.date_to.is_(None), ScheduleException.date_to >= date.today().isoformat()))
+        .order_by(ScheduleException.date_from.asc(), ScheduleException.weekday.asc())
+        .all()
+    )
+    staff_names = {st.id: st.name for st in staff}
+    return render_template("admin_exceptions.html", app_name=APP_NAME, shop=shop, staff=staff,
+                           staff_names=staff_names, exceptions=exceptions)
+
+@app.route("/admin/exceptions/<int:eid>/delete", methods=["POST"])
+def admin_exception_delete(eid: int):
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    ex = ScheduleException.query.get_or_404(eid)
+    sid = ex.shop_id
+    db.session.delete(ex)
+    compile_calendar(sid, [ex.staff_id] if ex.staff_id else None, ex.date_from, ex.date_to)
+    db.session.commit()
+    flash("🗑️ Διαγράφηκε η εξαίρεση.", "warning")
+    return redirect(url_for("admin_exceptions", sid=sid))
+
+@app.route("/admin/staff/<int:staff_id>/deactivate", methods=["POST"])
+def admin_staff_deactivate(staff_id: int):
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    st = Staff.query.get_or_404(staff_id)
+    st.is_active = False
+    db.session.commit()
+    flash("✅ Ο υπάλληλος απενεργοποιήθηκε.", "success")
+    return redirect_if_conflicts(st.shop_id, [st.id]) or redirect(url_for("admin_dashboard", shop_id=st.shop_id))
+
+@app.route("/admin/shop/<int:sid>/conflicts", methods=["GET", "POST"])
+def admin_conflicts(sid: int):
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    shop = Shop.query.get_or_404(sid)
+
+    if request.method == "POST":
+        selected = {int(x) for x in request.form.getlist("appt_id") if x.isdigit()}
+        # ξαναελέγχονται μόνο τα επιλεγμένα (μπορεί να άλλαξε το ωράριο στο μεταξύ)
+        chosen = find_schedule_conflicts(sid, appt_ids=selected) if selected else []
+        action = request.form.get("action")
+        if action == "cancel":
+            n = bulk_cancel_appointments(sid, [c["id"] for c in chosen])
+            flash(f"✅ Ακυρώθηκαν {n} ραντεβού.", "success")
+        elif action == "notify":
+            n, failed = bulk_notify_conflicts(shop, chosen)
+            msg = f"✉️ Στάλθηκαν {n} ειδοποιήσεις."
+            if failed:
+                msg += f" Απέτυχαν {failed}."
+            flash(msg, "success" if n and not failed else "warning")
+        return redirect(url_for("admin_conflicts", sid=sid))
+
+    conflicts = find_schedule_conflicts(sid)
+    return render_template("admin_conflicts.html", app_name=APP_NAME, shop=shop, conflicts=conflicts)
+
 @app.route("/admin/appt/<int:aid>/cancel", methods=["POST"])
 def admin_cancel_appt(aid: int):
     if not admin_required():
         return redirect(url_for("admin_login"))
     appt = Appointment.query.get_or_404(aid)
+    was_active = appt.status != "Ακυρωμένο"
     appt.status = "Ακυρωμένο"
+    if was_active:
+        bump_daily_stat(appt, Service.query.get(appt.service_id), cancellations=1, sign=-1)
     db.session.commit()
+    if was_active:
+        publish_slots_snapshot(appt.staff_id, appt.appt_date)
     return redirect(url_for("admin_dashboard"))
 
+@app.route("/admin/reports", methods=["GET"])
+def admin_reports():
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+
+    shops = Shop.query.order_by(Shop.name.asc()).all()
+    shop_id = request.args.get("shop_id", type=int) or (shops[0].id if shops else None)
+    since, until = report_range()
+    report = shop_report(shop_id, since, until) if shop_id else None
+
+    return render_template(
+        "admin_reports.html",
+        app_name=APP_NAME,
+        shops=shops,
+        selected_shop_id=shop_id,
+        since=since,
+        until=until,
+        report=report,
+        cents_to_eur=cents_to_eur
+    )
+
+@app.route("/admin/reports.csv", methods=["GET"])
+def admin_reports_csv():
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+
+    shop_id = request.args.get("shop_id", type=int) or 0
+    since, until = report_range()
+
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["day", "staff", "service", "bookings", "cancellations", "revenue_eur", "booked_minutes"])
+    rows = (
+        db.session.query(DailyStat, Staff.name, Service.name)
+        .join(Staff, Staff.id == DailyStat.staff_id)
+        .join(Service, Service.id == DailyStat.service_id)
+        .filter(DailyStat.shop_id == shop_id, DailyStat.day >= since, DailyStat.day <= until)
+        .order_by(DailyStat.day.asc(), Staff.name.asc(), Service.name.asc())
+    )
+    for ds, staff_name, service_name in rows:
+        w.writerow([ds.day, staff_name, service_name, ds.bookings, ds.cancellations,
+                    cents_to_eur(ds.revenue_cents), ds.booked_minutes])
+
+    return Response(
+        out.getvalue(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=report_{shop_id}_{since}_{until}.csv"},
+    )
+
+def report_range():
+    """(since, until) από τα query params, default τελευταίες 30 ημέρες."""
+    today = date.today()
+    since = (request.args.get("since") or "").strip()
+    until = (request.args.get("until") or "").strip()
+    try:
+        date.fromisoformat(since)
+    except ValueError:
+        since = (today - timedelta(days=29)).isoformat()
+    try:
+        date.fromisoformat(until)
+    except ValueError:
+        until = today.isoformat()
+    return since, until
+
+@app.route("/admin/slow", methods=["GET"])
+def admin_slow_requests():
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    rows = SlowRequest.query.order_by(SlowRequest.created_at.desc()).limit(100).all()
+    for r in rows:
+        r.breakdown = json.loads(r.sql_breakdown or "[]")
+    profiles = sorted(os.listdir(PROFILE_DIR), reverse=True) if os.path.isdir(PROFILE_DIR) else []
+    return render_template("admin_slow.html", app_name=APP_NAME, rows=rows, profiles=profiles,
+                           threshold_ms=SLOW_REQUEST_MS)
+
+@app.route("/admin/profiles/<path:name>", methods=["GET"])
+def admin_profile_download(name: str):
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True, mimetype="text/plain")
+
 @app.route("/healthz")
 def healthz():
     return {"ok": True}
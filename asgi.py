@@ -0,0 +1,267 @@
+"""Async serving mode (ASGI) για τα read-heavy JSON endpoints.
+
+    python -m pip install -r requirements-async.txt
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Async (χωρίς να κρατάνε worker όσο περιμένουν τη βάση):
+- /api/locations, /api/availability, /healthz
+- /book/<sid>/slots/stream (SSE, μία coroutine ανά σύνδεση)
+
+Όλα τα υπόλοιπα περνάνε αυτούσια στο Flask app (app.py) μέσω WSGI bridge,
+οπότε `gunicorn app:app` συνεχίζει να δουλεύει όπως πριν.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as flask_module
+from app import app as flask_app, db
+from app import Appointment, ScheduleException, ShopHours, Staff, StaffDayCalendar, StaffHours
+from app import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_TRUST_PROXY, RATE_LIMITS, SSE_HEARTBEAT_SEC, SSE_MAX_LIFETIME_SEC, SSE_QUEUE_SIZE,
+    TokenBuckets, _hours_map, day_intervals, decode_intervals, free_slots, hm_to_minutes,
+    location_matches, rate_limiter, slot_broker, sse_format, take_rate_limit, weekday_of,
+)
+
+ASYNC_DB_POOL = int(os.environ.get("ASYNC_DB_POOL") or "10")
+ASYNC_DB_MAX_OVERFLOW = int(os.environ.get("ASYNC_DB_MAX_OVERFLOW") or "10")
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS") or "10")
+
+# εδώ οι SSE συνδέσεις είναι coroutines: το live βήμα 4 ενεργό (LIVE_SLOTS=auto)
+flask_module.SERVING_ASGI = True
+
+
+def async_database_url():
+    """Ίδια βάση με το Flask app, με async driver (aiosqlite / asyncpg)."""
+    with flask_app.app_context():
+        url = db.engine.url
+    connect_args = {}
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    elif url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        # το asyncpg δεν δέχεται sslmode στο URL (Render το βάζει)
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            url = url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+    return url, connect_args
+
+
+def make_engine():
+    url, connect_args = async_database_url()
+    return create_async_engine(
+        url,
+        pool_size=ASYNC_DB_POOL,
+        max_overflow=ASYNC_DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
+
+engine = make_engine()
+
+
+# --- helpers ---------------------------------------------------------------
+
+def client_ip(request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        fwd = request.headers.get("x-forwarded-for", "")
+        if fwd:
+            return fwd.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "-"
+
+
+async def rate_limited(request, endpoint: str):
+    """Ίδια όρια με το enforce_rate_limits του Flask. Επιστρέφει 429 response ή None."""
+    rule = RATE_LIMITS.get(endpoint)
+    if not RATE_LIMIT_ENABLED or rule is None or request.method not in rule[0]:
+        return None
+    ip = client_ip(request)
+
+    try:
+        if isinstance(rate_limiter, TokenBuckets):
+            wait = take_rate_limit(endpoint, ip, time.monotonic())
+        else:
+            wait = await run_in_threadpool(take_rate_limit, endpoint, ip, time.time())
+    except Exception:
+        return None
+    if not wait:
+        return None
+    return JSONResponse({"error": "rate_limited"}, status_code=429,
+                        headers={"Retry-After": str(max(1, int(wait + 0.999)))})
+
+
+async def staff_intervals(conn, staff_id: int, shop_id: int, iso_date: str):
+    raw = (await conn.execute(
+        select(StaffDayCalendar.intervals)
+        .where(StaffDayCalendar.staff_id == staff_id, StaffDayCalendar.day == iso_date)
+    )).scalar_one_or_none()
+    if raw is not None:
+        return decode_intervals(raw)
+
+    # εκτός παραθύρου ημερολογίου: ίδιοι κανόνες με το load_schedule_rules
+    shop_hours = _hours_map((await conn.execute(
+        select(ShopHours.weekday, ShopHours.start_hm, ShopHours.end_hm).where(ShopHours.shop_id == shop_id)
+    )).all())
+    staff_rows = (await conn.execute(
+        select(StaffHours.weekday, StaffHours.start_hm, StaffHours.end_hm).where(StaffHours.staff_id == staff_id)
+    )).all()
+    exceptions = (await conn.execute(
+        select(ScheduleException.__table__)
+        .where(ScheduleException.shop_id == shop_id)
+        .where((ScheduleException.staff_id.is_(None)) | (ScheduleException.staff_id == staff_id))
+        .where((ScheduleException.date_to.is_(None)) | (ScheduleException.date_to >= iso_date))
+        .where((ScheduleException.date_from.is_(None)) | (ScheduleException.date_from <= iso_date))
+    )).all()
+    return day_intervals(iso_date, shop_hours, _hours_map(staff_rows) if staff_rows else None, exceptions)
+
+
+async def slots_for(staff_id: int, iso_date: str):
+    """Async αντίστοιχο του app.available_slots."""
+    async with engine.connect() as conn:
+        shop_id = (await conn.execute(select(Staff.shop_id).where(Staff.id == staff_id))).scalar_one_or_none()
+        if shop_id is None:
+            return None
+        intervals = await staff_intervals(conn, staff_id, shop_id, iso_date)
+        if not intervals:
+            return []
+        busy = [
+            (hm_to_minutes(start), hm_to_minutes(end))
+            for start, end in (await conn.execute(
+                select(Appointment.start_hm, Appointment.end_hm)
+                .where(Appointment.staff_id == staff_id, Appointment.appt_date == iso_date)
+                .where(Appointment.status != "Ακυρωμένο")
+            )).all()
+        ]
+    return free_slots(intervals, busy)
+
+
+def valid_date(iso_date: str) -> bool:
+    try:
+        weekday_of(iso_date)
+        return True
+    except Exception:
+        return False
+
+
+# --- endpoints -------------------------------------------------------------
+
+async def api_locations(request):
+    limited = await rate_limited(request, "api_locations")
+    if limited:
+        return limited
+    return JSONResponse(location_matches(request.query_params.get("q")))
+
+
+async def api_availability(request):
+    limited = await rate_limited(request, "api_availability")
+    if limited:
+        return limited
+    try:
+        staff_id = int(request.query_params.get("staff_id") or 0)
+    except ValueError:
+        staff_id = 0
+    iso_date = (request.query_params.get("date") or "").strip()
+    if not valid_date(iso_date):
+        return JSONResponse({"error": "date"}, status_code=400)
+    slots = await slots_for(staff_id, iso_date)
+    return JSONResponse({"staff_id": staff_id, "date": iso_date, "slots": slots or []})
+
+
+async def healthz(request):
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        return JSONResponse({"ok": False}, status_code=503)
+    return JSONResponse({"ok": True})
+
+
+class LoopQueue:
+    """Adapter ώστε το slot_broker (threads) να γεμίζει asyncio.Queue."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.q = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+    def put_nowait(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.q.put_nowait(event)
+        except asyncio.QueueFull:
+            pass  # αργός client: θα πάρει snapshot στο reconnect
+
+
+async def book_slots_stream(request):
+    sid = request.path_params["sid"]
+    try:
+        staff_id = int(request.query_params.get("staff_id") or 0)
+    except ValueError:
+        staff_id = 0
+    iso_date = (request.query_params.get("date") or "").strip()
+    if not flask_module.live_slots_enabled():
+        return JSONResponse({"error": "live_slots_disabled"}, status_code=404)
+    if not valid_date(iso_date):
+        return JSONResponse({"error": "date"}, status_code=400)
+    async with engine.connect() as conn:
+        ok = (await conn.execute(
+            select(Staff.id).where(Staff.id == staff_id, Staff.shop_id == sid)
+        )).scalar_one_or_none()
+    if ok is None:
+        return JSONResponse({"error": "staff"}, status_code=404)
+
+    lq = LoopQueue(asyncio.get_running_loop())
+    slot_broker.subscribe(staff_id, iso_date, lq)
+    slots = await slots_for(staff_id, iso_date)
+
+    async def gen():
+        deadline = time.monotonic() + SSE_MAX_LIFETIME_SEC
+        try:
+            yield "retry: 5000\n\n"
+            yield sse_format("snapshot", {"slots": slots or []})
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return
+                try:
+                    ev = await asyncio.wait_for(lq.q.get(), timeout=min(SSE_HEARTBEAT_SEC, left))
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield sse_format(ev["type"], ev)
+        finally:
+            slot_broker.unsubscribe(staff_id, iso_date, lq)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/locations", api_locations),
+        Route("/api/availability", api_availability),
+        Route("/healthz", healthz),
+        Route("/book/{sid:int}/slots/stream", book_slots_stream),
+        Mount("/", WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
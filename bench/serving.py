@@ -0,0 +1,201 @@
+"""Benchmark: sync (gunicorn app:app) vs async (uvicorn asgi:app).
+
+    python bench/serving.py                       # default: 10,100,500 συνδέσεις, 10s
+    python bench/serving.py -c 50,1000 -d 20 -w 2 --json bench_output.json
+
+Για κάθε server και endpoint μετράει requests/sec, latency (p50/p99) και
+μνήμη ανά ταυτόχρονη σύνδεση: (RSS υπό φορτίο − RSS idle) / συνδέσεις,
+αθροίζοντας όλο το δέντρο processes του server (Linux, /proc).
+
+Χρειάζεται: gunicorn (requirements.txt) και requirements-async.txt.
+Ο client είναι απλός HTTP/1.1 keep-alive πάνω σε asyncio (χωρίς εξαρτήσεις).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tree_rss_kb(pid: int) -> int:
+    """RSS (kB) του process και όλων των παιδιών του."""
+    total = 0
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+            for tid in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{tid}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+# --- HTTP client -----------------------------------------------------------
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("closed")
+    status = int(status_line.split()[1])
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    if length:
+        await reader.readexactly(length)
+    return status, close
+
+
+async def client(host, port, path, deadline, latencies, counters, started):
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+                started.set()
+            t0 = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, close = await _read_response(reader)
+            latencies.append(time.perf_counter() - t0)
+            counters["ok" if status == 200 else "bad"] += 1
+            if close:
+                writer.close()
+                writer = None
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            counters["err"] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def load(host, port, path, concurrency, duration, server_pid):
+    latencies, counters = [], {"ok": 0, "bad": 0, "err": 0}
+    deadline = time.perf_counter() + duration
+    started = asyncio.Event()
+    tasks = [asyncio.create_task(client(host, port, path, deadline, latencies, counters, started))
+             for _ in range(concurrency)]
+
+    # δείγμα μνήμης στη μέση του φορτίου
+    await asyncio.sleep(duration / 2)
+    rss_load = tree_rss_kb(server_pid)
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+    return dict(
+        rps=round(counters["ok"] / duration, 1),
+        p50_ms=round(pct(0.50), 2),
+        p99_ms=round(pct(0.99), 2),
+        errors=counters["bad"] + counters["err"],
+        rss_load_kb=rss_load,
+    )
+
+
+# --- servers ---------------------------------------------------------------
+
+def start_server(kind: str, port: int, workers: int, env: dict):
+    if kind == "sync":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "-w", str(workers),
+               "-b", f"127.0.0.1:{port}", "--backlog", "4096", "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(workers),
+               "--host", "127.0.0.1", "--port", str(port), "--backlog", "4096", "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET /healthz HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+                if s.recv(12).startswith(b"HTTP/1.1 200"):
+                    time.sleep(1)  # να σηκωθούν όλοι οι workers
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-c", "--concurrency", default="10,100,500")
+    ap.add_argument("-d", "--duration", type=float, default=10.0)
+    ap.add_argument("-w", "--workers", type=int, default=2)
+    ap.add_argument("--database-url", default="", help="default: προσωρινή SQLite με demo δεδομένα")
+    ap.add_argument("--json", default="", help="αποθήκευση αποτελεσμάτων σε αρχείο")
+    args = ap.parse_args()
+
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    paths = [
+        "/api/locations?q=%CF%87%CE%B1",  # "χα"
+        f"/api/availability?staff_id=1&date={monday.isoformat()}",
+        "/healthz",
+    ]
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    env["RATE_LIMIT_ENABLED"] = "0"
+    env["SLOW_REQUEST_MS"] = "600000"
+    env.setdefault("ASYNC_DB_POOL", "20")
+
+    # δημιουργία schema/demo δεδομένων μία φορά, πριν ξεκινήσουν πολλοί workers μαζί
+    subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, check=True)
+
+    results = []
+    for kind in ("sync", "async"):
+        port = free_port()
+        proc = start_server(kind, port, args.workers, env)
+        try:
+            for path in paths:
+                for c in (int(x) for x in args.concurrency.split(",")):
+                    rss_idle = tree_rss_kb(proc.pid)
+                    r = asyncio.run(load("127.0.0.1", port, path, c, args.duration, proc.pid))
+                    r.update(server=kind, path=path.split("?")[0], concurrency=c, rss_idle_kb=rss_idle,
+                             kb_per_conn=round(max(0, r["rss_load_kb"] - rss_idle) / c, 1))
+                    results.append(r)
+                    print(f"{kind:5} {r['path']:18} c={c:<5} {r['rps']:>9} req/s  "
+                          f"p50={r['p50_ms']:>8} ms  p99={r['p99_ms']:>8} ms  "
+                          f"err={r['errors']:<5} rss={r['rss_load_kb'] // 1024} MB  "
+                          f"{r['kb_per_conn']} kB/conn", flush=True)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""End-to-end: run_reminders με τοπικό SMTP stand-in και ελεγχόμενο ρολόι.
+
+    python -m pytest -q tests
+"""
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["REMINDER_WINDOWS"] = "24h,2h"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as m  # noqa: E402
+
+NOW = datetime(2030, 1, 7, 9, 0)  # Δευτέρα
+
+
+class FakeSMTP(socketserver.StreamRequestHandler):
+    """Ελάχιστο SMTP: κρατάει τους παραλήπτες κάθε μηνύματος, απορρίπτει όσους είναι στο `reject`."""
+
+    delivered = []
+    reject = set()
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 fake")
+        rcpt, in_data = [], False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    FakeSMTP.delivered.extend(rcpt)
+                    rcpt = []
+                    self.reply("250 queued")
+                continue
+            cmd = line.decode().strip()
+            verb = cmd[:4].upper()
+            if verb == "RCPT":
+                to = cmd.split(":", 1)[1].strip(" <>")
+                if to in FakeSMTP.reject:
+                    self.reply("550 no such user")
+                else:
+                    rcpt.append(to)
+                    self.reply("250 ok")
+            elif verb == "DATA":
+                in_data = True
+                self.reply("354 go")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture(scope="module")
+def smtp_port():
+    srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeSMTP)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def smtp(smtp_port, monkeypatch):
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(smtp_port))
+    monkeypatch.setenv("SMTP_TLS", "0")
+    monkeypatch.setenv("SMTP_FROM", "shop@example.com")
+    FakeSMTP.delivered = []
+    FakeSMTP.reject = set()
+    with m.app.app_context():
+        m.AppointmentReminder.query.delete()
+        m.Appointment.query.delete()
+        m.db.session.commit()
+        yield FakeSMTP
+        m.db.session.rollback()
+
+
+def book(day: str, hm: str, email: str):
+    appt = m.Appointment(shop_id=1, staff_id=1, service_id=1, appt_date=day, start_hm=hm,
+                         end_hm=m.minutes_to_hm(m.hm_to_minutes(hm) + 30),
+                         customer_name="Πελάτης", phone="69", customer_email=email)
+    m.db.session.add(appt)
+    m.db.session.commit()
+    return appt.id
+
+
+def reminders():
+    m.db.session.expire_all()
+    return {(r.appointment_id, r.kind): r for r in m.AppointmentReminder.query.all()}
+
+
+def test_windows_sent_once(smtp):
+    a = book("2030-01-07", "10:30", "a@example.com")   # σε 1.5h -> 2h
+    b = book("2030-01-08", "08:00", "b@example.com")   # σε 23h -> 24h
+    book("2030-01-09", "07:00", "c@example.com")       # εκτός παραθύρου
+
+    assert m.run_reminders(NOW) == 2
+    assert sorted(smtp.delivered) == ["a@example.com", "b@example.com"]
+    assert set(reminders()) == {(a, "2h"), (b, "24h")}
+
+    # ίδιο ρολόι: τίποτα καινούργιο
+    assert m.run_reminders(NOW) == 0
+    # 22.5h μετά: το b μπαίνει στο 2h, το c στο 24h
+    assert m.run_reminders(NOW + timedelta(hours=22, minutes=30)) == 2
+    assert sorted(smtp.delivered) == ["a@example.com", "b@example.com", "b@example.com", "c@example.com"]
+
+
+def test_refused_recipient_does_not_abort_batch(smtp):
+    ok1 = book("2030-01-07", "10:00", "ok1@example.com")
+    bad = book("2030-01-07", "10:30", "bad@example.com")
+    ok2 = book("2030-01-07", "11:00", "ok2@example.com")
+    smtp.reject = {"bad@example.com"}
+
+    assert m.run_reminders(NOW) == 2
+    rows = reminders()
+    assert rows[(ok1, "2h")].sent_at == NOW and rows[(ok2, "2h")].sent_at == NOW
+    assert rows[(bad, "2h")].sent_at is None
+    assert rows[(bad, "2h")].attempts == 1 and "550" in rows[(bad, "2h")].last_error
+
+    # μετά το REMINDER_STALE_CLAIM ξαναδοκιμάζεται μόνο το αποτυχημένο
+    smtp.reject = set()
+    later = NOW + m.REMINDER_STALE_CLAIM + timedelta(minutes=1)
+    assert m.run_reminders(later) == 1
+    assert sorted(smtp.delivered) == ["bad@example.com", "ok1@example.com", "ok2@example.com"]
+    assert reminders()[(bad, "2h")].sent_at == later
+
+
+def test_connection_failure_counts_attempt_and_retries(smtp, smtp_port, monkeypatch):
+    a = book("2030-01-07", "10:30", "a@example.com")
+    with socketserver.TCPServer(("127.0.0.1", 0), socketserver.BaseRequestHandler) as closed:
+        dead_port = closed.server_address[1]
+    monkeypatch.setenv("SMTP_PORT", str(dead_port))
+
+    with pytest.raises(OSError):
+        m.run_reminders(NOW)
+    row = reminders()[(a, "2h")]
+    assert row.sent_at is None and row.attempts == 1
+
+    monkeypatch.setenv("SMTP_PORT", str(smtp_port))
+    later = NOW + m.REMINDER_STALE_CLAIM + timedelta(minutes=1)
+    assert m.run_reminders(later) == 1
+    assert smtp.delivered == ["a@example.com"]
+    assert m.run_reminders(later + m.REMINDER_STALE_CLAIM * 2) == 0
+    assert smtp.delivered == ["a@example.com"]
+
+
+def test_no_reclaim_after_appointment_started(smtp):
+    a = book("2030-01-07", "09:20", "a@example.com")
+    smtp.reject = {"a@example.com"}
+    assert m.run_reminders(NOW) == 0
+    assert reminders()[(a, "2h")].attempts == 1
+
+    smtp.reject = set()
+    assert m.run_reminders(datetime(2030, 1, 7, 9, 30)) == 0  # το ραντεβού ξεκίνησε
+    assert smtp.delivered == []
+    assert reminders()[(a, "2h")].sent_at is None